@@ -1,4 +1,6 @@
-import numpy as np
+from scipy import sparse as sp
+
+from MarkovChainMatrix import MarkovChain as MatrixMarkovChain
 
 class MarkovChain(object):
     def __init__(self, transition_prob):
@@ -13,7 +15,63 @@ class MarkovChain(object):
             0.1, 'state2': 0.4}, 'state2': {...}}
         """
         self.transition_prob = transition_prob
+
+    @property
+    def transition_prob(self):
+        return self._transition_prob
+
+    @transition_prob.setter
+    def transition_prob(self, transition_prob):
+        self._transition_prob = transition_prob
         self.states = list(transition_prob.keys())
+        self._compiled = None
+
+    def compile(self, sparse=False):
+        """
+        Compiles the transition probabilities into an array based Markov
+        Chain indexed by state codes, which `next_state` and
+        `generate_states` then run on. Compilation happens automatically
+        on first use; call this to choose the storage or after modifying
+        transition_prob in place.
+
+        Parameters
+        ----------
+        sparse: bool
+            If True, the transition matrix is stored as a CSR matrix,
+            holding only the transitions present in transition_prob.
+            Otherwise it is a dense array.
+
+        Returns
+        -------
+        MarkovChainMatrix.MarkovChain: the compiled Markov Chain, whose
+            state codes follow the order of self.states.
+        """
+        index = {state: code for code, state in enumerate(self.states)}
+        rows, columns, probabilities = [], [], []
+        for state, transitions in self.transition_prob.items():
+            for next_state, probability in transitions.items():
+                if next_state not in index:
+                    raise ValueError("Unknown state {state!r} in the "
+                                     "transitions of {current!r}".format(
+                                         state=next_state, current=state))
+                rows.append(index[state])
+                columns.append(index[next_state])
+                probabilities.append(probability)
+
+        n_states = len(self.states)
+        transition_matrix = sp.csr_matrix(
+            (probabilities, (rows, columns)), shape=(n_states, n_states))
+        if not sparse:
+            transition_matrix = transition_matrix.toarray()
+        self._compiled = MatrixMarkovChain(transition_matrix=transition_matrix,
+                                           states=self.states)
+        return self._compiled
+
+    @property
+    def compiled(self):
+        if self._compiled is None:
+            self.compile()
+        return self._compiled
 
     def next_state(self, current_state):
         """
@@ -25,11 +83,9 @@ class MarkovChain(object):
         current_state: str
             The current state of the system.
         """
-        return np.random.choice(
-            self.states, p=[self.transition_prob[current_state][next_state]
-                            for next_state in self.states])
+        return self.compiled.next_state(current_state)
 
-    def generate_states(self, current_state, no=10):
+    def generate_states(self, current_state, no=10, random_state=None):
         """
         Generates the next states of the system.
 
@@ -40,13 +96,14 @@ class MarkovChain(object):
 
         no: int
             The number of future states to generate.
+
+        random_state: int or numpy.random.Generator
+            Seed or generator used for the draws. If None, the draws
+            depend on the global numpy random state, as for `next_state`.
         """
-        future_states = []
-        for i in range(no):
-            next_state = self.next_state(current_state)
-            future_states.append(next_state)
-            current_state = next_state
-        return future_states
+        codes = self.compiled.sample_chains(
+            1, no, initial_states=current_state, random_state=random_state)
+        return [self.states[code] for code in codes[0]]
 
 transition_prob = {'Sunny': {'Sunny': 0.8, 'Rainy': 0.19, 
  'Snowy': 0.01},
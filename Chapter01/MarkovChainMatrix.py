@@ -1,26 +1,65 @@
-from math import gcd
-from itertools import combinations
-from functools import reduce
+import operator
+from collections import OrderedDict
 
 import numpy as np
+from scipy import sparse
+
+from absorbing_chain import AbsorbingChainAnalysis
+from communicating_classes import CommunicatingClasses
+from stationary import solve_stationary_distribution
+
+
+def check_random_state(random_state):
+    """
+    Returns a numpy.random.Generator for the given seed.
+
+    Parameters
+    ----------
+    random_state: None, int or numpy.random.Generator
+        If a Generator, it is returned as is. If None, a new Generator is
+        seeded from the global numpy random state, so np.random.seed still
+        makes the draws reproducible. Otherwise it is used to seed a new
+        Generator.
+    """
+    if isinstance(random_state, np.random.Generator):
+        return random_state
+    if random_state is None:
+        random_state = np.random.randint(2 ** 32, dtype=np.int64)
+    return np.random.default_rng(random_state)
+
+
+def _check_steps(n):
+    """
+    Returns the number of steps n as a Python int (numpy integers
+    included), raising a ValueError if it is negative.
+    """
+    n = operator.index(n)
+    if n < 0:
+        raise ValueError("The number of steps can't be negative.")
+    return n
 
 
 class MarkovChain(object):
+    # Maximum number of P^(2^k) matrices kept by the n-step queries.
+    power_cache_size = 16
+
+
     def __init__(self, transition_matrix, states):
         """
         Initialize the MarkovChain instance.
 
         Parameters
         ----------
-        transition_matrix: 2-D array
+        transition_matrix: 2-D array or scipy.sparse matrix
             A 2-D array representing the probabilities of change of
-            state in the Markov Chain.
+            state in the Markov Chain. Sparse matrices are stored in CSR
+            format and are never converted to dense arrays.
 
         states: 1-D array
             An array representing the states of the Markov Chain. It
             needs to be in the same order as transition_matrix.
         """
-        self.transition_matrix = np.atleast_2d(transition_matrix)
+        self.transition_matrix = transition_matrix
         self.states = states
         self.index_dict = {self.states[index]: index for index in
                            range(len(self.states))}
@@ -28,6 +67,44 @@ class MarkovChain(object):
                            range(len(self.states))}
 
 
+    @property
+    def transition_matrix(self):
+        return self._transition_matrix
+
+
+    @transition_matrix.setter
+    def transition_matrix(self, transition_matrix):
+        # Everything derived from the transition matrix (sampling tables,
+        # communicating classes, stationary distributions, matrix powers,
+        # absorbing chain analysis, ...) is kept in `_cache` and thrown away whenever a new matrix
+        # is assigned.
+        if sparse.issparse(transition_matrix):
+            transition_matrix = sparse.csr_matrix(transition_matrix)
+            transition_matrix.sum_duplicates()
+        else:
+            transition_matrix = np.atleast_2d(transition_matrix)
+        self._transition_matrix = transition_matrix
+        self._cache = {}
+
+
+    @property
+    def is_sparse(self):
+        return sparse.issparse(self.transition_matrix)
+
+
+    def _transitions_from(self, index):
+        """
+        Returns the indices of the states reachable in one step from the
+        state at index, along with their transition probabilities.
+        """
+        if self.is_sparse:
+            start, end = self.transition_matrix.indptr[index:index + 2]
+            return (self.transition_matrix.indices[start:end],
+                    self.transition_matrix.data[start:end])
+        return (np.arange(self.transition_matrix.shape[1]),
+                self.transition_matrix[index, :])
+
+
     def next_state(self, current_state):
         """
         Returns the state of the random variable at the next time
@@ -38,9 +115,10 @@ class MarkovChain(object):
         current_state: str
             The current state of the system.
         """
-        return np.random.choice(
-            self.states,
-            p=self.transition_matrix[self.index_dict[current_state], :])
+        next_states, probabilities = self._transitions_from(
+            self.index_dict[current_state])
+        return self.state_dict[np.random.choice(next_states,
+                                                p=probabilities)]
 
 
     def generate_states(self, current_state, no=10):
@@ -63,7 +141,212 @@ class MarkovChain(object):
         return future_states
 
 
-    def is_accessible(self, i_state, f_state, check_up_to_depth=1000):
+    def encode_states(self, states):
+        """
+        Returns the integer codes of the given states.
+
+        Parameters
+        ----------
+        states: str or 1-D array
+            A state or an array of states. Arrays of integer dtype are
+            assumed to already hold state codes and are returned as is.
+        """
+        states = np.asarray(states)
+        if np.issubdtype(states.dtype, np.integer):
+            return states.astype(np.intp)
+        return np.vectorize(self.index_dict.__getitem__, otypes=[np.intp])(
+            states)
+
+
+    def decode_states(self, codes):
+        """
+        Returns the state labels of the given integer codes.
+
+        Parameters
+        ----------
+        codes: int or array-like
+            The integer codes, e.g. as returned by `sample_chains`.
+        """
+        return np.asarray(self.states)[codes]
+
+
+    def _sampling_table(self):
+        """
+        Returns the cumulative transition table used by `sample_chains`.
+
+        Row i of the cumulative probabilities is shifted by i and all the
+        rows are laid out one after the other, so a single sorted array can
+        be searched for every chain at once: the next state of a chain in
+        state i is found by searching for `i + u` with u uniform in [0, 1).
+        A sparse matrix gives one entry per stored transition, in its CSR
+        layout, along with the column of every entry; a dense matrix gives
+        n_states entries per row, and no columns since the position of an
+        entry modulo n_states is its column.
+        """
+        if 'sampling_table' not in self._cache:
+            if self.is_sparse:
+                table = self._sparse_sampling_table()
+            else:
+                table = self._dense_sampling_table()
+            self._cache['sampling_table'] = table
+        return self._cache['sampling_table']
+
+
+    def _dense_sampling_table(self):
+        """
+        Returns the (cumulative, None, last_position) table of a dense
+        transition matrix, see `_sampling_table`.
+        """
+        probabilities = self.transition_matrix
+        n_rows, n_columns = probabilities.shape
+        cumulative = np.cumsum(probabilities, axis=1, dtype=np.float64)
+        totals = cumulative[:, -1:].copy()
+        if np.any(totals <= 0):
+            raise ValueError("Every row of the transition matrix must have "
+                             "a positive sum.")
+        cumulative /= totals
+
+        # Pin everything from the last reachable state of each row onwards
+        # to exactly 1, so rounding can never select a trailing state with
+        # zero probability.
+        last_column = n_columns - 1 - np.argmax(
+            probabilities[:, ::-1] > 0, axis=1)
+        cumulative[np.arange(n_columns) >= last_column[:, np.newaxis]] = 1
+        cumulative += np.arange(n_rows)[:, np.newaxis]
+        last_position = np.arange(n_rows) * n_columns + last_column
+        return cumulative.ravel(), None, last_position
+
+
+    def _sparse_sampling_table(self):
+        """
+        Returns the (cumulative, indices, last_position) table of a sparse
+        transition matrix, see `_sampling_table`.
+        """
+        indptr = self.transition_matrix.indptr
+        indices = self.transition_matrix.indices
+        probabilities = self.transition_matrix.data
+        n_states = len(indptr) - 1
+        rows = np.repeat(np.arange(n_states), np.diff(indptr))
+
+        cumulative = np.cumsum(probabilities, dtype=np.float64)
+        offsets = np.concatenate([[0.], cumulative])[indptr]
+        totals = offsets[1:] - offsets[:-1]
+        if np.any(totals <= 0):
+            raise ValueError("Every row of the transition matrix must have "
+                             "a positive sum.")
+        cumulative -= offsets[:-1][rows]
+        cumulative /= totals[rows]
+
+        # Same pinning as for dense matrices, on the stored entries.
+        positive = np.flatnonzero(probabilities > 0)
+        last_position = positive[np.searchsorted(
+            positive, indptr[1:], side='left') - 1]
+        cumulative[np.arange(len(cumulative)) >= last_position[rows]] = 1
+        cumulative += rows
+        return cumulative, indices, last_position
+
+
+    def sample_chains(self, n_chains, no=10, initial_states=None,
+                      random_state=None, return_labels=False):
+        """
+        Generates the next states of several independent chains at once.
+
+        Unlike `generate_states`, all the chains are advanced together
+        with one vectorized draw per time step and the states are kept as
+        integer codes.
+
+        Parameters
+        ----------
+        n_chains: int
+            The number of independent chains to simulate.
+
+        no: int
+            The number of future states to generate for every chain.
+
+        initial_states: str, int or 1-D array
+            The state (or one state per chain) each chain starts from,
+            either as labels or as integer codes. If None, the initial
+            states are drawn uniformly.
+
+        random_state: int or numpy.random.Generator
+            Seed or generator used for the draws.
+
+        return_labels: bool
+            If True, state labels are returned instead of integer codes.
+
+        Returns
+        -------
+        paths: 2-D array, shape (n_chains, no)
+            The generated states of every chain, as integer codes of the
+            smallest unsigned dtype able to hold them (or as labels if
+            `return_labels` is True).
+        """
+        rng = check_random_state(random_state)
+        n_states = self.transition_matrix.shape[0]
+        cumulative, indices, last_position = self._sampling_table()
+
+        if initial_states is None:
+            current_states = rng.integers(n_states, size=n_chains)
+        else:
+            current_states = np.broadcast_to(
+                self.encode_states(initial_states), (n_chains,)).copy()
+
+        paths = np.empty((n_chains, no), np.min_scalar_type(n_states - 1))
+        for i in range(no):
+            position = np.searchsorted(
+                cumulative, current_states + rng.random(n_chains),
+                side='right')
+            # i + u may round up to i + 1 for large i, which lands on the
+            # next row; fall back to the last reachable state of the row.
+            np.minimum(position, last_position[current_states], out=position)
+            if indices is None:
+                next_states = position % n_states
+            else:
+                next_states = indices[position]
+            paths[:, i] = next_states
+            current_states = next_states
+
+        if return_labels:
+            return self.decode_states(paths)
+        return paths
+
+
+    @property
+    def communicating_classes(self):
+        """
+        The communicating classes of the Markov Chain, computed once and
+        cached until the transition matrix changes.
+        """
+        if 'communicating_classes' not in self._cache:
+            self._cache['communicating_classes'] = CommunicatingClasses(
+                self.transition_matrix)
+        return self._cache['communicating_classes']
+
+
+    def get_communicating_class(self, state):
+        """
+        Returns the states in the same communicating class as state.
+
+        Parameters
+        ----------
+        state: str
+            The state whose communicating class is needed.
+        """
+        classes = self.communicating_classes
+        return self.decode_states(
+            classes.members(classes.labels[self.index_dict[state]]))
+
+
+    def get_communicating_classes(self):
+        """
+        Returns the list of communicating classes of the Markov Chain.
+        """
+        classes = self.communicating_classes
+        return [self.decode_states(classes.members(class_index))
+                for class_index in range(classes.n_classes)]
+
+
+    def is_accessible(self, i_state, f_state, check_up_to_depth=None):
         """
         Check if state f_state is accessible from i_state.
 
@@ -74,81 +357,266 @@ class MarkovChain(object):
 
         f_state: str
             The state to which accessibility needs to be checked.
+
+        check_up_to_depth: int, optional
+            Ignored, kept for backward compatibility. The answer comes
+            from the communicating classes, so it is exact whatever the
+            depth.
         """
-        counter = 0
-        reachable_states = [self.index_dict[i_state]]
-        for state in reachable_states:
-            if counter == check_up_to_depth:
-                break
-            if state == self.index_dict[f_state]:
-                return True
-            else:
-                reachable_states.extend(np.nonzero(self.transition_matrix[state, :])[0])
-            counter = counter + 1
-        return False
+        return self.communicating_classes.is_accessible(
+            self.index_dict[i_state], self.index_dict[f_state])
 
 
     def is_irreducible(self):
         """
         Check if the Markov Chain is irreducible.
         """
-        for (i, j) in combinations(self.states, 2):
-            if not self.is_accessible(i, j):
-                return False
-        return True
+        return self.communicating_classes.is_irreducible()
 
 
-    def get_period(self, state, max_number_stps = 50, max_number_trls = 100):
+    def get_period(self, state, max_number_stps=None, max_number_trls=None):
         """
-        Returns the period of the state in the Markov Chain.
+        Returns the period of the state in the Markov Chain, or None if
+        the chain can never return to it.
 
         Parameters
         ----------
         state: str
             The state for which the period needs to be computed.
+
+        max_number_stps, max_number_trls: int, optional
+            Ignored, kept for backward compatibility. The period is
+            computed exactly from the transition graph instead of by
+            sampling.
         """
-        initial_state = state
-        max_number_steps = max_number_stps
-        max_number_trials = max_number_trls
-        periodic_lengths = []
-        a= []
+        classes = self.communicating_classes
+        period = classes.periods[classes.labels[self.index_dict[state]]]
+        return int(period) if period else None
 
-        for i in range(1, max_number_steps+1):
-            for j in range(max_number_trials):
-                last_states_chain = self.generate_states(current_state=initial_state, no=i)[-1]
-                if last_states_chain == initial_state:
-                    periodic_lengths.append(i)
-                    break
 
-        if len(periodic_lengths) >0:
-            a = reduce(gcd, periodic_lengths)
-            return a
+    def get_periods(self):
+        """
+        Returns the periods of all the states, in the order of
+        self.states. States which can't be returned to have period 0.
+        """
+        classes = self.communicating_classes
+        return classes.periods[classes.labels]
 
 
     def is_aperiodic(self):
         """
         Checks if the Markov Chain is aperiodic.
         """
-        periods = [self.get_period(state) for state in self.states]
-        for period in periods:
-            if period != 1:
-                return False
-        return True
+        return bool(np.all(self.communicating_classes.periods == 1))
+
+
+    def stationary_distribution(self, method='eigen', tol=1e-10,
+                                max_iter=10000, epsilon=0.25,
+                                diagnostics=True):
+        """
+        Returns the stationary distribution of the Markov Chain along with
+        convergence diagnostics and the estimated mixing time. Results are
+        cached until the transition matrix changes.
+
+        Parameters
+        ----------
+        method: str
+            One of 'eigen', 'power' or 'linear'. See
+            stationary.solve_stationary_distribution for details.
+
+        tol: float
+            The tolerance of the power iteration.
+
+        max_iter: int
+            The maximum number of power iterations.
+
+        epsilon: float
+            The total variation distance used to define the mixing time.
+
+        diagnostics: bool
+            Whether to compute the second eigenvalue and the mixing time,
+            which can cost more than the distribution itself.
+
+        Returns
+        -------
+        stationary.StationaryResult: the distribution (in the order of
+            self.states) and its diagnostics.
+        """
+        key = ('stationary_distribution', method, tol, max_iter, epsilon,
+               diagnostics)
+        if key not in self._cache:
+            self._cache[key] = solve_stationary_distribution(
+                self.transition_matrix, method=method, tol=tol,
+                max_iter=max_iter, epsilon=epsilon, diagnostics=diagnostics,
+                classes=self.communicating_classes)
+        return self._cache[key]
+
+
+    def _power_of_two(self, exponent):
+        """
+        Returns P^(2^exponent), computed by repeated squaring. The squares
+        are kept in a least recently used cache of at most
+        `power_cache_size` matrices shared by all the n-step queries.
+        """
+        if exponent == 0:
+            return self.transition_matrix
+        powers = self._cache.setdefault('matrix_powers', OrderedDict())
+        if exponent in powers:
+            powers.move_to_end(exponent)
+            return powers[exponent]
+
+        # Restart from the largest square still cached below exponent.
+        known = [key for key in powers if key < exponent]
+        current = max(known) if known else 0
+        power = powers[current] if known else self.transition_matrix
+        while current < exponent:
+            power = power @ power
+            current += 1
+            powers[current] = power
+            if len(powers) > self.power_cache_size:
+                powers.popitem(last=False)
+        return power
+
+
+    def _missing_powers(self, n):
+        return sum(1 for exponent in range(1, n.bit_length())
+                   if exponent not in self._cache.get('matrix_powers', ()))
+
+
+    def n_step_transition_matrix(self, n):
+        """
+        Returns the n-step transition matrix P^n, whose entry (i, j) is
+        the probability of being in state j after n steps when starting
+        from state i. Computed by exponentiation by squaring.
+
+        Parameters
+        ----------
+        n: int
+            The number of steps.
+        """
+        n = _check_steps(n)
+        result = None
+        for exponent in range(n.bit_length()):
+            if n >> exponent & 1:
+                power = self._power_of_two(exponent)
+                result = power if result is None else result @ power
+        if result is None:
+            n_states = self.transition_matrix.shape[0]
+            return (sparse.identity(n_states, format='csr') if self.is_sparse
+                    else np.eye(n_states))
+        return result
+
+
+    def n_step_transition_matrices(self, ns):
+        """
+        Returns the n-step transition matrices for several horizons. All
+        the horizons share the cached squares of the transition matrix.
+
+        Parameters
+        ----------
+        ns: list of int
+            The numbers of steps.
+        """
+        ns = [_check_steps(n) for n in ns]
+        # Computing the largest horizon first fills the cache with every
+        # square the others need.
+        matrices = {n: None for n in ns}
+        for n in sorted(matrices, reverse=True):
+            matrices[n] = self.n_step_transition_matrix(n)
+        return [matrices[n] for n in ns]
+
+
+    def n_step_distribution(self, distribution, n, use_squares=None):
+        """
+        Returns the distribution of the state after n steps, without
+        forming P^n.
+
+        Parameters
+        ----------
+        distribution: 1-D array
+            The distribution of the current state, in the order of
+            self.states.
+
+        n: int
+            The number of steps.
+
+        use_squares: bool
+            Whether to multiply the vector by the cached squares of P
+            (O(log n) products) or by P itself n times. By default the
+            squares are used when computing the missing ones is cheaper
+            than the n products; for sparse chains only if they are
+            already cached, since squaring fills in sparse matrices.
+        """
+        n = _check_steps(n)
+        distribution = np.asarray(distribution, dtype=np.float64)
+        if use_squares is None:
+            missing = self._missing_powers(n)
+            use_squares = (missing == 0 if self.is_sparse else
+                           missing * self.transition_matrix.shape[0] < n)
+
+        if not use_squares:
+            for _ in range(n):
+                distribution = distribution @ self.transition_matrix
+            return distribution
+        for exponent in range(n.bit_length()):
+            if n >> exponent & 1:
+                distribution = distribution @ self._power_of_two(exponent)
+        return distribution
+
+
+    def n_step_row(self, state, n, use_squares=None):
+        """
+        Returns the distribution of the state after n steps when starting
+        from state, i.e. the corresponding row of P^n.
+
+        Parameters
+        ----------
+        state: str
+            The initial state.
+
+        n: int
+            The number of steps.
+
+        use_squares: bool
+            See `n_step_distribution`.
+        """
+        distribution = np.zeros(self.transition_matrix.shape[0])
+        distribution[self.index_dict[state]] = 1
+        return self.n_step_distribution(distribution, n, use_squares)
+
+
+    def n_step_probability(self, i_state, f_state, n):
+        """
+        Returns the probability of being in f_state after n steps when
+        starting from i_state.
+
+        Parameters
+        ----------
+        i_state: str
+            The initial state.
+
+        f_state: str
+            The final state.
+
+        n: int
+            The number of steps.
+        """
+        return self.n_step_row(i_state, n)[self.index_dict[f_state]]
 
 
     def is_transient(self, state):
         """
-        Checks if a state is transient or not.
+        Checks if a state is transient or not, i.e. if the chain can leave
+        its communicating class for good.
 
         Parameters
         ----------
         state: str
             The state for which the transient property needs to be checked.
         """
-        if np.all(self.transition_matrix[~self.index_dict[state], self.index_dict[state]] == 0):
-            return True
-        else:
-            return False
+        classes = self.communicating_classes
+        return not classes.is_closed[classes.labels[self.index_dict[state]]]
+
 
     def is_absorbing(self, state):
         """
@@ -165,3 +633,52 @@ class MarkovChain(object):
             return True
         else:
             return False
+
+
+    @property
+    def absorbing_analysis(self):
+        """
+        The absorbing chain analysis (fundamental matrix, absorption
+        probabilities, expected steps to absorption) of the Markov Chain,
+        cached until the transition matrix changes.
+        """
+        if 'absorbing_analysis' not in self._cache:
+            self._cache['absorbing_analysis'] = AbsorbingChainAnalysis(
+                self.transition_matrix, self.communicating_classes)
+        return self._cache['absorbing_analysis']
+
+
+    def absorption_probabilities(self, state):
+        """
+        Returns the probability of ending in each absorbing state when
+        starting from state.
+
+        Parameters
+        ----------
+        state: str
+            The initial state.
+
+        Returns
+        -------
+        dict: the absorption probability of every absorbing state.
+        """
+        analysis = self.absorbing_analysis
+        probabilities = analysis.absorption_probabilities_from(
+            self.index_dict[state])
+        return {self.state_dict[index]: float(probability)
+                for index, probability
+                in zip(analysis.absorbing_states, probabilities)}
+
+
+    def expected_steps_to_absorption(self, state):
+        """
+        Returns the expected number of steps before the chain gets
+        absorbed when starting from state, inf if it may never be absorbed.
+
+        Parameters
+        ----------
+        state: str
+            The initial state.
+        """
+        return self.absorbing_analysis.expected_steps_from(
+            self.index_dict[state])
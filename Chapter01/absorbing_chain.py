@@ -0,0 +1,169 @@
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from communicating_classes import CommunicatingClasses
+
+
+class AbsorbingChainAnalysis(object):
+    def __init__(self, transition_matrix, classes=None):
+        """
+        Analysis of an absorbing Markov Chain.
+
+        The states are split using the communicating classes: absorbing
+        states, transient states (the ones of the classes that aren't
+        closed), and recurrent states (the ones of the closed classes
+        without an absorbing state), from which the chain is never
+        absorbed.
+
+        Writing the transition matrix in canonical form, with Q the
+        transitions between transient states and R the transitions from
+        transient to absorbing states, every quantity is derived from the
+        fundamental matrix N = (I - Q)^-1. N is never inverted: I - Q is
+        factorized once (sparse LU) and each query is a solve against that
+        factorization. Results are cached.
+
+        Parameters
+        ----------
+        transition_matrix: 2-D array or scipy.sparse matrix
+            The transition matrix of the Markov Chain.
+
+        classes: CommunicatingClasses, optional
+            The communicating classes of the chain, computed if None.
+        """
+        transition_matrix = sparse.csr_matrix(transition_matrix)
+        if classes is None:
+            classes = CommunicatingClasses(transition_matrix)
+        self.n_states = transition_matrix.shape[0]
+        is_absorbing = transition_matrix.diagonal() == 1
+        in_closed_class = classes.is_closed[classes.labels]
+        self.absorbing_states = np.flatnonzero(is_absorbing)
+        self.transient_states = np.flatnonzero(~in_closed_class)
+        self.recurrent_states = np.flatnonzero(in_closed_class &
+                                               ~is_absorbing)
+        if not len(self.absorbing_states):
+            raise ValueError("The Markov Chain has no absorbing state.")
+
+        # Position of every state among the transient (or absorbing)
+        # states, -1 for the others.
+        self._transient_position = np.full(self.n_states, -1)
+        self._transient_position[self.transient_states] = np.arange(
+            len(self.transient_states))
+        self._absorbing_position = np.full(self.n_states, -1)
+        self._absorbing_position[self.absorbing_states] = np.arange(
+            len(self.absorbing_states))
+        # Transient states from which a recurrent state is accessible may
+        # never be absorbed.
+        trapping = classes.is_closed.copy()
+        trapping[classes.labels[self.absorbing_states]] = False
+        self._may_avoid_absorption = classes.classes_reaching(trapping)[
+            classes.labels[self.transient_states]]
+
+        transient_rows = transition_matrix[self.transient_states]
+        self._q = transient_rows[:, self.transient_states]
+        self._r = transient_rows[:, self.absorbing_states].tocsc()
+        self._lu = None
+        if len(self.transient_states):
+            # Every transient state eventually leaves the transient states,
+            # so I - Q is invertible.
+            self._lu = splu((sparse.identity(len(self.transient_states)) -
+                             self._q).tocsc())
+        self._cache = {}
+
+    def _solve(self, rhs, transpose=False):
+        if self._lu is None:
+            return np.zeros_like(rhs, dtype=np.float64)
+        return self._lu.solve(np.asarray(rhs, dtype=np.float64),
+                              trans='T' if transpose else 'N')
+
+    def _unit(self, index):
+        position = self._transient_position[index]
+        if position < 0:
+            raise ValueError("State {index} isn't transient.".format(
+                index=index))
+        unit = np.zeros(len(self.transient_states))
+        unit[position] = 1
+        return unit
+
+    def fundamental_matrix(self):
+        """
+        Returns the fundamental matrix N, whose entry (i, j) is the
+        expected number of visits to transient state j when starting from
+        transient state i. This is a dense (transient x transient) array;
+        prefer `expected_visits` for large chains.
+        """
+        if 'fundamental_matrix' not in self._cache:
+            self._cache['fundamental_matrix'] = self._solve(
+                np.eye(len(self.transient_states)))
+        return self._cache['fundamental_matrix']
+
+    def expected_visits(self, index):
+        """
+        Returns the expected number of visits to every transient state when
+        starting from the given transient state, i.e. one row of N.
+
+        Parameters
+        ----------
+        index: int
+            The index of the transient initial state.
+        """
+        key = ('expected_visits', index)
+        if key not in self._cache:
+            self._cache[key] = self._solve(self._unit(index), transpose=True)
+        return self._cache[key]
+
+    def expected_steps(self):
+        """
+        Returns the expected number of steps before absorption from every
+        transient state, N 1, or inf from the transient states which may
+        never be absorbed.
+        """
+        if 'expected_steps' not in self._cache:
+            steps = self._solve(np.ones(len(self.transient_states)))
+            steps[self._may_avoid_absorption] = np.inf
+            self._cache['expected_steps'] = steps
+        return self._cache['expected_steps']
+
+    def absorption_probabilities(self):
+        """
+        Returns the probabilities N R of ending in every absorbing state
+        (columns) from every transient state (rows), as a dense array.
+        """
+        if 'absorption_probabilities' not in self._cache:
+            self._cache['absorption_probabilities'] = self._solve(
+                self._r.toarray())
+        return self._cache['absorption_probabilities']
+
+    def absorption_probabilities_from(self, index):
+        """
+        Returns the probabilities of ending in every absorbing state when
+        starting from the given state (all 0 from a recurrent state).
+
+        Parameters
+        ----------
+        index: int
+            The index of the initial state.
+        """
+        position = self._absorbing_position[index]
+        if position >= 0:
+            probabilities = np.zeros(len(self.absorbing_states))
+            probabilities[position] = 1
+            return probabilities
+        if self._transient_position[index] < 0:
+            return np.zeros(len(self.absorbing_states))
+        return self._r.T @ self.expected_visits(index)
+
+    def expected_steps_from(self, index):
+        """
+        Returns the expected number of steps before absorption when
+        starting from the given state, inf if it may never be absorbed.
+
+        Parameters
+        ----------
+        index: int
+            The index of the initial state.
+        """
+        position = self._transient_position[index]
+        if position < 0:
+            return 0. if self._absorbing_position[index] >= 0 else np.inf
+        return float(self.expected_steps()[position])
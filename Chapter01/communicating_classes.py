@@ -0,0 +1,193 @@
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, connected_components
+
+
+class CommunicatingClasses(object):
+    def __init__(self, transition_matrix):
+        """
+        Computes the communicating classes of a Markov Chain.
+
+        The classes are the strongly connected components of the graph
+        given by the nonzero pattern of the transition matrix. They are
+        found with a single linear time pass, after which accessibility,
+        irreducibility and class membership queries are cheap.
+
+        Parameters
+        ----------
+        transition_matrix: 2-D array or sparse matrix
+            The transition matrix of the Markov Chain.
+        """
+        graph = csr_matrix(transition_matrix)
+        graph.eliminate_zeros()
+        self._graph = graph
+        self.n_states = graph.shape[0]
+        self.n_classes, self.labels = connected_components(
+            graph, directed=True, connection='strong')
+
+        # Edges between two different classes form the condensation of
+        # the graph, which is a DAG. A class with no outgoing edge in the
+        # condensation is closed: the chain can never leave it.
+        sources = np.repeat(np.arange(self.n_states), np.diff(graph.indptr))
+        source_classes = self.labels[sources]
+        target_classes = self.labels[graph.indices]
+        leaving = source_classes != target_classes
+        self.is_closed = np.ones(self.n_classes, dtype=bool)
+        self.is_closed[source_classes[leaving]] = False
+        self._condensation = csr_matrix(
+            (np.ones(np.count_nonzero(leaving)),
+             (source_classes[leaving], target_classes[leaving])),
+            shape=(self.n_classes, self.n_classes))
+
+        self._order = np.argsort(self.labels, kind='stable')
+        self._boundaries = np.searchsorted(self.labels[self._order],
+                                           np.arange(self.n_classes + 1))
+        self._reachable_classes = {}
+        self._periods = None
+
+    def members(self, class_index):
+        """
+        Returns the indices of the states in the given class.
+
+        Parameters
+        ----------
+        class_index: int
+            The index of the communicating class.
+        """
+        return self._order[self._boundaries[class_index]:
+                           self._boundaries[class_index + 1]]
+
+    def reachable_classes(self, class_index):
+        """
+        Returns a boolean mask of the classes accessible from the given
+        class. The result is cached per class.
+
+        Parameters
+        ----------
+        class_index: int
+            The index of the communicating class.
+        """
+        if class_index not in self._reachable_classes:
+            reachable = np.zeros(self.n_classes, dtype=bool)
+            reachable[breadth_first_order(
+                self._condensation, class_index, directed=True,
+                return_predecessors=False)] = True
+            self._reachable_classes[class_index] = reachable
+        return self._reachable_classes[class_index]
+
+    def classes_reaching(self, targets):
+        """
+        Returns a boolean mask of the classes from which at least one of
+        the target classes is accessible (the targets included), with a
+        single search over the reversed condensation.
+
+        Parameters
+        ----------
+        targets: 1-D boolean array
+            The mask of the target classes.
+        """
+        targets = np.flatnonzero(targets)
+        reaching = np.zeros(self.n_classes, dtype=bool)
+        if not len(targets):
+            return reaching
+        # Search from an extra node linked to every target.
+        reverse = self._condensation.T.tocoo()
+        n_nodes = self.n_classes + 1
+        graph = csr_matrix(
+            (np.ones(reverse.nnz + len(targets)),
+             (np.concatenate([reverse.row,
+                              np.full(len(targets), self.n_classes)]),
+              np.concatenate([reverse.col, targets]))),
+            shape=(n_nodes, n_nodes))
+        order = breadth_first_order(graph, self.n_classes, directed=True,
+                                    return_predecessors=False)
+        reaching[order[order < self.n_classes]] = True
+        return reaching
+
+    @property
+    def periods(self):
+        """
+        The period of every class, with 0 for the classes that can't be
+        returned to (single states without a self loop).
+
+        All the states of a class share its period. Levels are assigned by
+        a breadth first search inside each class, and the period is the
+        gcd of `level[i] + 1 - level[j]` over the edges i -> j of the
+        class, which takes a single pass over the nonzero entries.
+        """
+        if self._periods is None:
+            sources = np.repeat(np.arange(self.n_states),
+                                np.diff(self._graph.indptr))
+            targets = self._graph.indices
+            internal = self.labels[sources] == self.labels[targets]
+            sources, targets = sources[internal], targets[internal]
+
+            # One search over the internal edges, started from an extra
+            # node linked to the first state of every class.
+            roots = self._order[self._boundaries[:-1]]
+            n_nodes = self.n_states + 1
+            graph = csr_matrix(
+                (np.ones(len(sources) + self.n_classes),
+                 (np.concatenate([sources,
+                                  np.full(self.n_classes, self.n_states)]),
+                  np.concatenate([targets, roots]))),
+                shape=(n_nodes, n_nodes))
+            _, predecessors = breadth_first_order(
+                graph, self.n_states, directed=True,
+                return_predecessors=True)
+            levels = _tree_depths(predecessors, self.n_states)
+
+            edge_classes = self.labels[sources]
+            order = np.argsort(edge_classes, kind='stable')
+            differences = np.abs(levels[sources] + 1 - levels[targets])[order]
+            starts = np.searchsorted(edge_classes[order],
+                                     np.arange(self.n_classes))
+            has_edges = np.bincount(edge_classes,
+                                    minlength=self.n_classes) > 0
+            self._periods = np.zeros(self.n_classes, dtype=np.int64)
+            if len(differences):
+                self._periods[has_edges] = np.gcd.reduceat(
+                    differences, starts[has_edges])
+        return self._periods
+
+    def is_accessible(self, i_index, f_index):
+        """
+        Check if state f_index is accessible from i_index.
+
+        Parameters
+        ----------
+        i_index: int
+            The index of the state from which the accessibility needs to
+            be checked.
+
+        f_index: int
+            The index of the state to which accessibility needs to be
+            checked.
+        """
+        i_class = self.labels[i_index]
+        f_class = self.labels[f_index]
+        if i_class == f_class:
+            return True
+        return bool(self.reachable_classes(i_class)[f_class])
+
+    def is_irreducible(self):
+        """
+        Check if all the states form a single communicating class.
+        """
+        return self.n_classes == 1
+
+
+def _tree_depths(predecessors, root):
+    """
+    Returns the depth of every node of a search tree given by its
+    predecessor array, using pointer jumping instead of a Python loop
+    over the nodes.
+    """
+    parents = predecessors.copy()
+    parents[root] = root
+    depths = np.ones(len(parents), dtype=np.int64)
+    depths[root] = 0
+    while np.any(parents != root):
+        depths += depths[parents]
+        parents = parents[parents]
+    return depths
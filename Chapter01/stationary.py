@@ -0,0 +1,284 @@
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import (ArpackNoConvergence, LinearOperator, eigs,
+                                 spsolve)
+
+from communicating_classes import CommunicatingClasses
+
+StationaryResult = namedtuple('StationaryResult', [
+    'distribution', 'method', 'converged', 'n_iter', 'residual',
+    'second_eigenvalue', 'mixing_time'])
+StationaryResult.__doc__ = """
+Stationary distribution of a Markov Chain along with convergence
+diagnostics.
+
+distribution: 1-D array
+    The stationary distribution.
+method: str
+    The method used to compute it.
+converged: bool
+    Whether the method reached the requested tolerance.
+n_iter: int
+    The number of iterations used (1 for the direct methods).
+residual: float
+    The L1 norm of `distribution * P - distribution`.
+second_eigenvalue: float
+    The second largest eigenvalue modulus of the transition matrix,
+    computed from its spectrum whatever the method. It is 1 for chains
+    with more than one closed class, and nan if it wasn't computed or
+    didn't converge.
+mixing_time: float
+    The estimated number of steps needed to get within epsilon of the
+    stationary distribution in total variation, from any initial state
+    (nan along with second_eigenvalue).
+"""
+
+METHODS = ('eigen', 'power', 'linear')
+
+# Distance above 1 of the shift used to find the eigenvalue 1 of sparse
+# transition matrices, see `_eigen`.
+_EIGEN_SHIFT = 1e-8
+
+
+def solve_stationary_distribution(transition_matrix, method='eigen',
+                                  tol=1e-10, max_iter=10000, epsilon=0.25,
+                                  diagnostics=True, classes=None):
+    """
+    Returns the stationary distribution of a Markov Chain.
+
+    The stationary distribution is unique only for irreducible chains,
+    otherwise one of the stationary distributions is returned.
+
+    Parameters
+    ----------
+    transition_matrix: 2-D array or scipy.sparse matrix
+        The transition matrix of the Markov Chain. Sparse matrices are
+        handled with sparse eigen and linear solvers.
+
+    method: str
+        'eigen' takes the left eigenvector for the eigenvalue 1, 'power'
+        repeatedly applies the transition matrix to an initial
+        distribution until the L1 change is below `tol`, and 'linear'
+        solves the linear system `pi (P - I) = 0, sum(pi) = 1`. For
+        reducible chains that system is singular, so 'linear' solves it
+        on the first closed class and returns a distribution which is
+        zero everywhere else.
+
+    tol: float
+        The tolerance of the power iteration.
+
+    max_iter: int
+        The maximum number of power iterations.
+
+    epsilon: float
+        The total variation distance used to define the mixing time.
+
+    diagnostics: bool
+        Whether to compute the second eigenvalue and the mixing time (see
+        `second_largest_eigenvalue`). If False, they are nan, and the
+        only work done is the one of the method.
+
+    classes: CommunicatingClasses, optional
+        The communicating classes of the chain, used by 'linear'. Computed
+        if None.
+
+    Returns
+    -------
+    StationaryResult: the distribution and its diagnostics.
+    """
+    if sparse.issparse(transition_matrix):
+        transition_matrix = sparse.csr_matrix(transition_matrix)
+    else:
+        transition_matrix = np.atleast_2d(transition_matrix)
+    second_eigenvalue = None
+    if method == 'eigen':
+        distribution, second_eigenvalue = _eigen(transition_matrix)
+        converged, n_iter = True, 1
+    elif method == 'power':
+        distribution, converged, n_iter = _power(transition_matrix, tol,
+                                                 max_iter)
+    elif method == 'linear':
+        distribution = _linear(transition_matrix, classes)
+        converged, n_iter = True, 1
+    else:
+        raise ValueError("method should be one of {methods}, got "
+                         "{method!r}".format(methods=METHODS, method=method))
+    if not diagnostics:
+        second_eigenvalue = np.nan
+    elif second_eigenvalue is None:
+        second_eigenvalue = second_largest_eigenvalue(transition_matrix,
+                                                      distribution)
+
+    residual = np.abs(distribution @ transition_matrix - distribution).sum()
+    return StationaryResult(
+        distribution=distribution, method=method, converged=converged,
+        n_iter=n_iter, residual=float(residual),
+        second_eigenvalue=float(second_eigenvalue),
+        mixing_time=mixing_time(distribution, second_eigenvalue, epsilon))
+
+
+def second_largest_eigenvalue(transition_matrix, distribution=None,
+                              tol=1e-6, max_iter=300):
+    """
+    Returns the second largest eigenvalue modulus of a transition matrix.
+
+    Dense matrices get all their eigenvalues computed, in O(n^3). For
+    sparse ones, ARPACK looks for the largest eigenvalue of the transition
+    matrix deflated by its stationary distribution, i.e. with the
+    eigenvalue 1 of pi removed, which only takes sparse products. Chains
+    whose eigenvalues cluster near 1 may not converge within max_iter
+    restarts, in which case nan is returned.
+
+    Parameters
+    ----------
+    transition_matrix: 2-D array or scipy.sparse matrix
+        The transition matrix of the Markov Chain.
+
+    distribution: 1-D array, optional
+        A stationary distribution of the chain, used for the deflation of
+        sparse matrices. Computed if None.
+
+    tol: float
+        The relative accuracy asked from ARPACK.
+
+    max_iter: int
+        The maximum number of ARPACK restarts.
+    """
+    n_states = transition_matrix.shape[0]
+    if n_states < 2:
+        return 0.
+    if not sparse.issparse(transition_matrix) or n_states <= 3:
+        if sparse.issparse(transition_matrix):
+            transition_matrix = transition_matrix.toarray()
+        moduli = np.sort(np.abs(np.linalg.eigvals(transition_matrix)))
+        return moduli[-2]
+
+    if distribution is None:
+        distribution = _eigen(transition_matrix)[0]
+    transition_T = transition_matrix.T.tocsr()
+    # (P^T - pi 1^T) keeps the eigenvalues of P^T but the 1 of pi, which
+    # becomes 0 (a second closed class keeps another 1).
+    deflated = LinearOperator(
+        (n_states, n_states), dtype=np.float64,
+        matvec=lambda x: transition_T @ x - distribution * x.sum())
+    try:
+        eigenvalue = eigs(deflated, k=1, which='LM', tol=tol,
+                          maxiter=max_iter, return_eigenvectors=False)
+    except ArpackNoConvergence:
+        return np.nan
+    return min(float(np.abs(eigenvalue[0])), 1.)
+
+
+def mixing_time(distribution, second_eigenvalue, epsilon=0.25):
+    """
+    Returns the spectral estimate of the mixing time,
+    `log(1 / (epsilon * min(pi))) / (1 - lambda_2)`.
+
+    This is an upper bound for reversible chains and the usual rule of
+    thumb otherwise. It is infinite for periodic or reducible chains.
+
+    Parameters
+    ----------
+    distribution: 1-D array
+        The stationary distribution.
+
+    second_eigenvalue: float
+        The second largest eigenvalue modulus of the transition matrix.
+
+    epsilon: float
+        The total variation distance to the stationary distribution.
+    """
+    if np.isnan(second_eigenvalue):
+        return np.nan
+    smallest = distribution.min()
+    if second_eigenvalue >= 1 - 1e-12 or smallest <= 0:
+        return np.inf
+    return float(np.ceil(np.log(1 / (epsilon * smallest)) /
+                         (1 - second_eigenvalue)))
+
+
+def _normalize(distribution):
+    distribution = np.clip(np.real(distribution), 0, None)
+    return distribution / distribution.sum()
+
+
+def _eigen(transition_matrix):
+    """
+    Returns the left eigenvector of the transition matrix for the
+    eigenvalue 1, normalized, and the second largest eigenvalue modulus.
+
+    Dense matrices are fully decomposed, which gives the second eigenvalue
+    for free. For sparse ones, ARPACK looks for the eigenvalue closest to
+    a shift just above 1 (shift-invert mode), which is 1 itself however
+    close the next eigenvalues are; the second eigenvalue is left to
+    `second_largest_eigenvalue` (None is returned).
+    """
+    if sparse.issparse(transition_matrix):
+        if transition_matrix.shape[0] > 3:
+            _, eigenvectors = eigs(transition_matrix.T.tocsc(), k=1,
+                                   sigma=1 + _EIGEN_SHIFT)
+            distribution = eigenvectors[:, 0]
+            distribution = distribution * np.sign(distribution.real.sum())
+            return _normalize(distribution), None
+        transition_matrix = transition_matrix.toarray()
+    eigenvalues, eigenvectors = np.linalg.eig(transition_matrix.T)
+    index = np.argmin(np.abs(eigenvalues - 1))
+    distribution = eigenvectors[:, index]
+    # Fix the sign before clipping, the eigenvector is only defined up to
+    # a scalar.
+    distribution = distribution * np.sign(distribution.real.sum())
+    moduli = np.abs(np.delete(eigenvalues, index))
+    return _normalize(distribution), moduli.max() if len(moduli) else 0.
+
+
+def _power(transition_matrix, tol, max_iter):
+    n_states = transition_matrix.shape[0]
+    # Start away from the uniform distribution, which is already
+    # stationary for doubly stochastic (e.g. periodic permutation) chains
+    # and would hide their slow or missing convergence.
+    distribution = np.arange(1., n_states + 1)
+    distribution /= distribution.sum()
+    change = np.inf
+    for n_iter in range(1, max_iter + 1):
+        new_distribution = distribution @ transition_matrix
+        change = np.abs(new_distribution - distribution).sum()
+        distribution = new_distribution
+        if change < tol:
+            break
+    return _normalize(distribution), bool(change < tol), n_iter
+
+
+def _linear(transition_matrix, classes=None):
+    if classes is None:
+        classes = CommunicatingClasses(transition_matrix)
+    if classes.is_irreducible():
+        return _solve_balance(transition_matrix)
+    # pi (P - I) = 0 is singular for reducible chains: solve it on the
+    # first closed class, whose distribution is stationary for the whole
+    # chain.
+    closed = classes.members(np.flatnonzero(classes.is_closed)[0])
+    if sparse.issparse(transition_matrix):
+        restricted = transition_matrix[closed][:, closed]
+    else:
+        restricted = transition_matrix[np.ix_(closed, closed)]
+    distribution = np.zeros(transition_matrix.shape[0])
+    distribution[closed] = _solve_balance(restricted)
+    return distribution
+
+
+def _solve_balance(transition_matrix):
+    n_states = transition_matrix.shape[0]
+    # pi (P - I) = 0 has rank n - 1 for an irreducible chain, replace one
+    # of its equations with the normalization constraint.
+    rhs = np.zeros(n_states)
+    rhs[-1] = 1
+    if sparse.issparse(transition_matrix):
+        system = (transition_matrix.T - sparse.identity(n_states)).tocsr()
+        system = sparse.vstack([system[:-1],
+                                np.ones((1, n_states))]).tocsc()
+        return _normalize(spsolve(system, rhs))
+    system = transition_matrix.T - np.eye(n_states)
+    system[-1, :] = 1
+    return _normalize(np.linalg.solve(system, rhs))
@@ -0,0 +1,169 @@
+import numpy as np
+from scipy import sparse as sp
+
+from MarkovChainMatrix import MarkovChain
+
+
+class TransitionCountEstimator(object):
+    def __init__(self, n_states, sparse=False):
+        """
+        Maximum likelihood estimator of a Markov Chain from sequences of
+        integer state codes.
+
+        Sequences are consumed chunk by chunk (lists, generators, memory
+        mapped arrays, ...) and only the transition counts are kept, so
+        memory stays O(n_states^2) (or O(nnz) with `sparse`) whatever the
+        amount of data. Estimators fitted on different parts of the data,
+        e.g. by different worker processes, can be combined with `merge`.
+
+        Parameters
+        ----------
+        n_states: int
+            The number of states. States are coded 0 to n_states - 1.
+
+        sparse: bool
+            If True, the counts are kept in a CSR matrix.
+        """
+        self.n_states = n_states
+        self.sparse = sparse
+        if sparse:
+            self.counts = sp.csr_matrix((n_states, n_states), dtype=np.int64)
+        else:
+            self.counts = np.zeros((n_states, n_states), dtype=np.int64)
+        self._last_state = None
+
+    def partial_fit(self, chunk, new_sequence=False):
+        """
+        Adds the transitions of a chunk of a sequence to the counts. The
+        transition from the last state of the previous chunk to the first
+        state of this one is counted too, unless `new_sequence` is True.
+
+        Parameters
+        ----------
+        chunk: 1-D array-like
+            The next states of the sequence, as integer codes.
+
+        new_sequence: bool
+            Whether the chunk starts a new sequence.
+        """
+        chunk = np.asarray(chunk).ravel()
+        if new_sequence:
+            self._last_state = None
+        if not len(chunk):
+            return self
+        if chunk.min() < 0 or chunk.max() >= self.n_states:
+            raise ValueError("State codes should be between 0 and "
+                             "{max}.".format(max=self.n_states - 1))
+
+        if self._last_state is None:
+            from_states, to_states = chunk[:-1], chunk[1:]
+        else:
+            from_states = np.concatenate([[self._last_state], chunk[:-1]])
+            to_states = chunk
+        if self.sparse:
+            self.counts = self.counts + sp.csr_matrix(
+                (np.ones(len(from_states), dtype=np.int64),
+                 (from_states, to_states)),
+                shape=(self.n_states, self.n_states))
+        else:
+            self.counts += np.bincount(
+                from_states.astype(np.int64) * self.n_states + to_states,
+                minlength=self.n_states ** 2).reshape(self.counts.shape)
+        self._last_state = int(chunk[-1])
+        return self
+
+    def end_sequence(self):
+        """
+        Marks the end of the current sequence, so the next chunk isn't
+        linked to it.
+        """
+        self._last_state = None
+        return self
+
+    def fit(self, sequences, chunk_size=1000000):
+        """
+        Adds the transitions of several sequences to the counts.
+
+        Parameters
+        ----------
+        sequences: iterable of 1-D array-like
+            The sequences of integer state codes. Each of them is read in
+            slices of `chunk_size` states, so memory mapped arrays are
+            never loaded at once.
+
+        chunk_size: int
+            The number of states processed at a time.
+        """
+        for sequence in sequences:
+            self.end_sequence()
+            for start in range(0, len(sequence), chunk_size):
+                self.partial_fit(sequence[start:start + chunk_size])
+        return self.end_sequence()
+
+    def merge(self, other):
+        """
+        Adds the counts of another estimator, e.g. one fitted by another
+        worker on a different part of the data.
+
+        Parameters
+        ----------
+        other: TransitionCountEstimator
+            The estimator to merge into this one.
+        """
+        if other.n_states != self.n_states:
+            raise ValueError("Can't merge estimators with a different "
+                             "number of states.")
+        if self.sparse:
+            self.counts = self.counts + sp.csr_matrix(other.counts)
+        elif other.sparse:
+            self.counts += other.counts.toarray()
+        else:
+            self.counts += other.counts
+        return self
+
+    def transition_matrix(self, smoothing=0.):
+        """
+        Returns the estimated transition matrix, the row normalized counts.
+        States that were never left stay in place with probability 1.
+
+        Parameters
+        ----------
+        smoothing: float
+            Pseudo count added to every transition (additive smoothing).
+            Not available with sparse counts, as it makes the matrix dense.
+        """
+        if self.sparse:
+            if smoothing:
+                raise ValueError("Additive smoothing isn't supported for "
+                                 "sparse counts.")
+            counts = self.counts.astype(np.float64)
+            totals = np.asarray(counts.sum(axis=1)).ravel()
+            unseen = totals == 0
+            totals[unseen] = 1
+            return (sp.diags(1 / totals) @ counts + sp.diags(
+                unseen.astype(np.float64))).tocsr()
+
+        counts = self.counts + smoothing
+        totals = counts.sum(axis=1, keepdims=True)
+        unseen = totals[:, 0] == 0
+        counts[unseen, unseen] = 1
+        totals[unseen] = 1
+        return counts / totals
+
+    def to_markov_chain(self, states=None, smoothing=0.):
+        """
+        Returns the estimated Markov Chain.
+
+        Parameters
+        ----------
+        states: 1-D array
+            The state labels, in the order of the codes. Defaults to the
+            codes themselves.
+
+        smoothing: float
+            Pseudo count added to every transition.
+        """
+        if states is None:
+            states = list(range(self.n_states))
+        return MarkovChain(transition_matrix=self.transition_matrix(smoothing),
+                           states=states)
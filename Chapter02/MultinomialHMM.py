@@ -1,80 +1,202 @@
 import numpy as np
 
 
+def _alias_table(probabilities):
+    """
+    Returns the alias tables (Vose's method) used to draw from every row of
+    a matrix of probabilities at once.
+
+    A draw from row i picks a column j uniformly and keeps it with
+    probability `threshold[i, j]`, otherwise it returns `alias[i, j]`,
+    so every draw costs O(1) whatever the number of columns.
+    """
+    probabilities = np.atleast_2d(probabilities)
+    n_rows, n_columns = probabilities.shape
+    threshold = np.ones((n_rows, n_columns))
+    alias = np.tile(np.arange(n_columns), (n_rows, 1))
+    for row in range(n_rows):
+        scaled = (probabilities[row] * n_columns /
+                  probabilities[row].sum()).tolist()
+        small = [column for column in range(n_columns) if scaled[column] < 1]
+        large = [column for column in range(n_columns) if scaled[column] >= 1]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            threshold[row, less] = scaled[less]
+            alias[row, less] = more
+            scaled[more] -= 1 - scaled[less]
+            (small if scaled[more] < 1 else large).append(more)
+        # Whatever is left only misses 1 by rounding errors.
+    return threshold.ravel(), alias.ravel(), n_columns
+
+
+def _draw(table, rows, rng):
+    """
+    Draws one column for each of the given rows from a table returned by
+    `_alias_table`.
+    """
+    threshold, alias, n_columns = table
+    # A single uniform gives both the column and the acceptance test.
+    uniform = rng.random(len(rows)) * n_columns
+    columns = np.minimum(uniform.astype(np.intp), n_columns - 1)
+    uniform -= columns
+    index = rows * n_columns + columns
+    return np.where(uniform < threshold[index], columns, alias[index])
+
+
 class MultinomialHMM:
     def __init__(self, num_states, observation_states, prior_probabilities,
-        transition_matrix, emission_probabilities):
+                 transition_matrix, emission_probabilities):
+        """
+        Initialize Hidden Markov Model
+        Parameters
+        -----------
+        num_states: int
+        Number of states of latent variable
+        observation_states: 1-D array
+        An array representing the set of all observations
+        prior_probabilities: 1-D array
+        An array representing the prior probabilities of all the states
+        of latent variable
+        transition_matrix: 2-D array
+        A matrix representing the transition probabilities of change of
+        state of latent variable
+        emission_probabilities: 2-D array
+        A matrix representing the probability of a given observation
+        given the state of the latent variable
+        """
+        # The latent variables form a Markov chain, whose states are
+        # labelled z0, z1, ... and drawn from the rows of transition_matrix.
+        self.states = ['z{index}'.format(index=index) for index in
+                       range(num_states)]
+        self.index_dict = {state: index for index, state in
+                           enumerate(self.states)}
+        self.observation_states = observation_states
+        self.prior_probabilities = np.atleast_1d(prior_probabilities)
+        self.transition_matrix = np.atleast_2d(transition_matrix)
+        self.emission_probabilities = np.atleast_2d(emission_probabilities)
+        self._alias_tables = None
+
+    def next_state(self, current_state):
         """
-         Initialize Hidden Markov Model
-         Parameters
-         -----------
-         num_states: int
-         Number of states of latent variable
-         observation_states: 1-D array
-         An array representing the set of all observations
-         prior_probabilities: 1-D array
-         An array representing the prior probabilities of all the states
-         of latent variable
-         transition_matrix: 2-D array
-         A matrix representing the transition probabilities of change of
-         state of latent variable
-         emission_probabilities: 2-D array
-         A matrix representing the probability of a given observation
-         given the state of the latent variable
-         """
-         # As latent variables form a Markov chain, we can use
-         # use the previous defined MarkovChain class to create it
-         self.latent_variable_markov_chain = MarkovChain(
-            transition_matrix=transition_matrix,
-            states=['z{index}'.format(index=index) for index in
-                range(num_states)],
-         )
-         self.observation_states = observation_states
-         self.prior_probabilities = np.atleast_1d(prior_probabilities)
-         self.transition_matrix = np.atleast_2d(transition_matrix)
-         self.emission_probabilities = np.atleast_2d(emission_probabilities)
+        Returns the state of the latent variable at the next time instance.
+
+        Parameters
+        ----------
+        current_state: str
+            The current state of the latent variable.
+        """
+        return np.random.choice(
+            self.states,
+            p=self.transition_matrix[self.index_dict[current_state], :])
 
     def observation_from_state(self, state):
-     """
-     Generate observation for a given state in accordance with
-     the emission probabilities
-     
-     Parameters
-     ----------
-     state: int
-        Index of the current state
-     """
-     state_index = self.latent_variable_markov_chain.index_dict[state]
-     return np.random.choice(self.observation_states,
-                             p=self.emission_probabilities[state_index, :])
+        """
+        Generate observation for a given state in accordance with
+        the emission probabilities
+
+        Parameters
+        ----------
+        state: int
+           Index of the current state
+        """
+        state_index = self.index_dict[state]
+        return np.random.choice(self.observation_states,
+                                p=self.emission_probabilities[state_index, :])
 
     def generate_samples(self, no=10):
-     """
-     Generate samples from the hidden Markov model
-
-     Parameters
-     ----------
-     no: int
-        Number of samples to be drawn
-     
-     Returns
-     -------
-     observations: 1-D array
-        An array of sequence of observations
-     state_sequence: 1-D array
-        An array of sequence of states
-     """
-     observations = []
-     state_sequence = []
-     initial_state = np.random.choice(
-                    self.latent_variable_markov_chain.states,
-                    p=self.prior_probabilities)
-     state_sequence.append(initial_state)
-     observations.append(self.observation_from_state(initial_state))
-     current_state = initial_state
-     for i in range(2, no):
-         next_state = self.latent_variable_markov_chain.next_state(current_state)
-         state_sequence.append(next_state)
-         observations.append(self.observation_from_state(next_state))
-         current_state = next_state
-     return observations, state_sequence
+        """
+        Generate samples from the hidden Markov model
+
+        Parameters
+        ----------
+        no: int
+           Number of samples to be drawn
+
+        Returns
+        -------
+        observations: 1-D array
+           An array of sequence of observations
+        state_sequence: 1-D array
+           An array of sequence of states
+        """
+        observations = []
+        state_sequence = []
+        initial_state = np.random.choice(self.states,
+                                         p=self.prior_probabilities)
+        state_sequence.append(initial_state)
+        observations.append(self.observation_from_state(initial_state))
+        current_state = initial_state
+        for i in range(1, no):
+            next_state = self.next_state(current_state)
+            state_sequence.append(next_state)
+            observations.append(self.observation_from_state(next_state))
+            current_state = next_state
+        return observations, state_sequence
+
+    def sample_sequences(self, n_sequences, no=10, random_state=None):
+        """
+        Generate many sequences of samples at once from the hidden Markov
+        model.
+
+        All the sequences are advanced together, with one vectorized draw
+        of the states and one of the observations per time step, using
+        alias tables precomputed from the model parameters.
+
+        Parameters
+        ----------
+        n_sequences: int
+           Number of sequences to be drawn
+
+        no: int
+           Number of samples in every sequence
+
+        random_state: int or numpy.random.Generator
+           Seed or generator used for the draws. If None, a seed is drawn
+           from the global numpy random state
+
+        Returns
+        -------
+        observations: 2-D array, shape (n_sequences, no)
+           The observations, as indices into observation_states
+        state_sequence: 2-D array, shape (n_sequences, no)
+           The states, as indices of the latent variable states
+
+        Both arrays are stored in column major (time major) order.
+        """
+        if random_state is None:
+            # Follow the global state, as generate_samples does.
+            random_state = np.random.randint(2 ** 32, dtype=np.int64)
+        rng = (random_state if isinstance(random_state, np.random.Generator)
+               else np.random.default_rng(random_state))
+        n_states, n_observations = self.emission_probabilities.shape
+        prior_table, transition_table, emission_table = self._tables()
+
+        # Filled one time step (row) at a time and transposed at the end,
+        # so every write is contiguous.
+        observations = np.empty((no, n_sequences),
+                                np.min_scalar_type(n_observations - 1))
+        state_sequence = np.empty((no, n_sequences),
+                                  np.min_scalar_type(n_states - 1))
+        states = _draw(prior_table, np.zeros(n_sequences, dtype=np.intp),
+                       rng)
+        for i in range(no):
+            if i:
+                states = _draw(transition_table, states, rng)
+            state_sequence[i] = states
+            observations[i] = _draw(emission_table, states, rng)
+        return observations.T, state_sequence.T
+
+    def _tables(self):
+        """
+        Returns the alias tables of the prior, transition and emission
+        probabilities, built once and reused as long as these attributes
+        aren't replaced (modifying the arrays in place isn't detected).
+        """
+        parameters = (self.prior_probabilities, self.transition_matrix,
+                      self.emission_probabilities)
+        if (self._alias_tables is None or
+                any(cached is not parameter for cached, parameter in
+                    zip(self._alias_tables[0], parameters))):
+            self._alias_tables = (parameters, tuple(
+                _alias_table(parameter) for parameter in parameters))
+        return self._alias_tables[1]
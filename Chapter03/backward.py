@@ -1,4 +1,13 @@
-def backward(obs, transition, emission, init):
+import numpy as np
+from scipy import sparse
+
+from dp_cache import make_key
+from forward import emission_matrix, forward_scaled
+from sparse_kernels import choose_transition
+
+
+def backward(obs, transition, emission, init, cache=None,
+             model_fingerprint=None):
     """
     Runs backward algorithm on the HMM.
 
@@ -19,10 +28,23 @@ def backward(obs, transition, emission, init):
                 The initial probability of HMM.
                 size = {n_states}
 
+    cache:      dp_cache.DPCache, optional
+                If given, the result is looked up in (and added to) this
+                cache, keyed by the model parameters and obs.
+
+    model_fingerprint: str, optional
+                The `dp_cache.fingerprint` of (transition, emission, init),
+                so the parameters aren't hashed again on every cached call.
+
     Returns
     -------
     float: Probability value for the obs to occur.
     """
+    if cache is not None:
+        return cache.get_or_compute(
+            make_key('backward', obs, (transition, emission, init),
+                     model_fingerprint=model_fingerprint),
+            lambda: backward(obs, transition, emission, init))
     n_states = transition.shape[0]
     bkw = [{} for t in range(len(obs))]
     T = len(obs)
@@ -35,3 +57,112 @@ def backward(obs, transition, emission, init):
                                     range(n_states))
     prob = sum((init[y] * emission[obs[0]] * bkw[0][y]) for y in range(n_states))
     return prob
+
+
+def forward_backward(obs, transition, emission, init, return_xi=False,
+                     cache=None, model_fingerprint=None):
+    """
+    Runs the scaled forward-backward algorithm on the HMM.
+
+    The backward pass reuses the scaling factors of `forward_scaled`, so
+    the product of the scaled alpha and beta directly gives the state
+    posteriors. Only the alpha matrix is stored (and overwritten with the
+    posteriors), so memory is O(n_obs x n_states). Sparse enough
+    transition matrices are run in CSR format, in O(nnz) per step.
+
+    Parameters
+    ----------
+    obs:        1D list, array-like
+                The list of observed states.
+
+    transition: 2D array-like or scipy.sparse matrix
+                The transition probability of the HMM.
+                size = {n_states x n_states}
+
+    emission:   1D or 2D array-like
+                The emission probabiltiy of the HMM, either a full matrix
+                of size {n_states x n_observations} or a 1D array as for
+                `backward`.
+
+    init:       1D array-like
+                The initial probability of HMM.
+                size = {n_states}
+
+    return_xi:  bool
+                If True, the expected number of transitions between every
+                pair of states is returned as well.
+
+    cache:      dp_cache.DPCache, optional
+                If given, the result is looked up in (and added to) this
+                cache, keyed by the model parameters and obs.
+
+    model_fingerprint: str, optional
+                The `dp_cache.fingerprint` of (transition, emission, init),
+                so the parameters aren't hashed again on every cached call.
+
+    Returns
+    -------
+    float: The log probability of the obs.
+
+    gamma:  2D array, size = {n_obs x n_states}
+            gamma[t, i] is the probability of being in state i at time t
+            given obs.
+
+    xi:     2D array, size = {n_states x n_states}
+            Only if return_xi. xi[i, j] is the expected number of
+            transitions from state i to state j given obs, summed over time.
+            A CSR matrix if transition is a scipy.sparse matrix, whichever
+            kernels were used.
+    """
+    if cache is not None:
+        return cache.get_or_compute(
+            make_key('forward_backward', obs, (transition, emission, init),
+                     (return_xi,), model_fingerprint),
+            lambda: forward_backward(obs, transition, emission, init,
+                                     return_xi))
+    obs = np.asarray(obs)
+    input_sparse = sparse.issparse(transition)
+    transition = choose_transition(transition)
+    is_sparse = sparse.issparse(transition)
+    n_states = transition.shape[0]
+    emission_by_obs = np.ascontiguousarray(
+        emission_matrix(emission, n_states).T)
+    log_prob, gamma, scales = forward_scaled(obs, transition, emission,
+                                             init, return_alpha=True)
+    if np.isneginf(log_prob):
+        raise ValueError("The observations have probability 0 under the "
+                         "model.")
+
+    if is_sparse:
+        # xi is only accumulated on the stored entries of transition.
+        rows = np.repeat(np.arange(n_states), np.diff(transition.indptr))
+        columns = transition.indices
+        xi = np.zeros(transition.nnz) if return_xi else None
+    else:
+        xi = np.zeros((n_states, n_states)) if return_xi else None
+    beta_t = np.ones(n_states)
+    for t in reversed(range(len(obs) - 1)):
+        weighted_beta = emission_by_obs[obs[t + 1]] * beta_t / scales[t + 1]
+        if return_xi:
+            # gamma[t] still holds the scaled alpha at this point.
+            if is_sparse:
+                xi += gamma[t][rows] * weighted_beta[columns]
+            else:
+                xi += np.outer(gamma[t], weighted_beta)
+        beta_t = transition @ weighted_beta
+        gamma[t] *= beta_t
+    gamma /= gamma.sum(axis=1, keepdims=True)
+
+    if return_xi:
+        if is_sparse:
+            xi = sparse.csr_matrix(
+                (xi * transition.data, columns, transition.indptr),
+                shape=transition.shape)
+            if not input_sparse:
+                xi = xi.toarray()
+        else:
+            xi *= transition
+            if input_sparse:
+                xi = sparse.csr_matrix(xi)
+        return log_prob, gamma, xi
+    return log_prob, gamma
@@ -0,0 +1,169 @@
+import numpy as np
+
+from forward import emission_matrix
+
+
+def _ragged_layout(offsets):
+    """
+    Returns the layout used to advance a ragged batch of sequences
+    together.
+
+    The sequences are sorted by decreasing length, so the sequences still
+    running at time t are always the first `n_active[t]` ones and
+    finished sequences are masked out by slicing.
+    """
+    offsets = np.asarray(offsets)
+    lengths = np.diff(offsets)
+    order = np.argsort(-lengths, kind='stable')
+    starts = offsets[:-1][order]
+    sorted_lengths = lengths[order]
+    max_length = sorted_lengths[0] if len(sorted_lengths) else 0
+    n_active = np.searchsorted(-sorted_lengths, -np.arange(max_length),
+                               side='left')
+    return order, starts, n_active
+
+
+def forward_batch(obs, offsets, transition, emission, init):
+    """
+    Runs the scaled forward algorithm on a batch of sequences at once.
+
+    All the sequences are advanced together, one matrix product per time
+    step, instead of one Python level call per sequence.
+
+    Parameters
+    ----------
+    obs:        1D array-like
+                The observations of all the sequences, concatenated.
+
+    offsets:    1D array-like
+                Sequence i is obs[offsets[i]:offsets[i + 1]].
+                size = {n_sequences + 1}
+
+    transition: 2D array-like
+                The transition probability of the HMM.
+                size = {n_states x n_states}
+
+    emission:   1D or 2D array-like
+                The emission probabiltiy of the HMM, see `forward_scaled`.
+
+    init:       1D array-like
+                The initial probability of HMM.
+                size = {n_states}
+
+    Returns
+    -------
+    1D array: The log probability of every sequence.
+              size = {n_sequences}
+    """
+    obs = np.asarray(obs)
+    transition = np.asarray(transition, dtype=np.float64)
+    n_states = transition.shape[0]
+    emission_by_obs = np.ascontiguousarray(
+        emission_matrix(emission, n_states).T)
+    order, starts, n_active = _ragged_layout(offsets)
+
+    log_probs = np.zeros(len(order))
+    if not len(n_active):
+        return log_probs
+    n = n_active[0]
+    alpha = np.asarray(init, dtype=np.float64) * emission_by_obs[
+        obs[starts[:n]]]
+    for t, n in enumerate(n_active):
+        if t:
+            alpha[:n] = (alpha[:n] @ transition) * emission_by_obs[
+                obs[starts[:n] + t]]
+        scales = alpha[:n].sum(axis=1)
+        impossible = scales <= 0
+        scales[impossible] = 1
+        alpha[:n] /= scales[:, np.newaxis]
+        log_scales = np.log(scales)
+        log_scales[impossible] = -np.inf
+        log_probs[:n] += log_scales
+
+    result = np.empty_like(log_probs)
+    result[order] = log_probs
+    return result
+
+
+def viterbi_batch(obs, offsets, transition, emission, init=None,
+                  block_size=2 ** 22):
+    """
+    Return the MAP estimate of the state trajectories of a batch of
+    sequences, computed in log space for all the sequences at once.
+
+    Parameters
+    ----------
+    obs : array (N,)
+        The observations of all the sequences, concatenated. int dtype.
+
+    offsets : array (S + 1,)
+        Sequence i is obs[offsets[i]:offsets[i + 1]].
+
+    transition : array (K, K)
+        State transition matrix.
+
+    emission : array (K, M) or (M,)
+        Emission matrix, see `forward_scaled`.
+
+    init: optional, (K,)
+        Initial state probabilities. If None, uniform initial distribution
+        is assumed.
+
+    block_size: int
+        Maximum number of scores computed at once; the sequences are
+        processed in blocks of `block_size // K^2` per time step.
+
+    Returns
+    -------
+    x : array (N,)
+        The most likely state trajectories, laid out like obs.
+
+    log_probs : array (S,)
+        The log probability of the most likely trajectory of every
+        sequence.
+    """
+    obs = np.asarray(obs)
+    transition = np.asarray(transition, dtype=np.float64)
+    K = transition.shape[0]
+    init = init if init is not None else np.full(K, 1 / K)
+    with np.errstate(divide='ignore'):
+        log_transition_T = np.ascontiguousarray(np.log(transition).T)
+        log_emission_by_obs = np.log(np.ascontiguousarray(
+            emission_matrix(emission, K).T))
+        log_init = np.log(init)
+    order, starts, n_active = _ragged_layout(offsets)
+
+    state_dtype = np.min_scalar_type(K - 1)
+    x = np.zeros(len(obs), state_dtype)
+    log_probs = np.zeros(len(order))
+    if not len(n_active):
+        return x, log_probs
+    # Backpointers are stored in the layout of obs.
+    T2 = np.zeros((len(obs), K), state_dtype)
+    rows_per_block = max(1, block_size // (K * K))
+
+    delta = log_init + log_emission_by_obs[obs[starts[:n_active[0]]]]
+    for t in range(1, len(n_active)):
+        n = n_active[t]
+        positions = starts[:n] + t
+        for block in range(0, n, rows_per_block):
+            rows = slice(block, min(n, block + rows_per_block))
+            # scores[s, j, i]: best path of sequence s ending with i -> j,
+            # laid out so the max over i runs on contiguous memory.
+            scores = delta[rows, np.newaxis, :] + log_transition_T
+            best = np.argmax(scores, axis=2)
+            T2[positions[rows]] = best
+            delta[rows] = np.take_along_axis(
+                scores, best[:, :, np.newaxis], axis=2)[:, :, 0]
+        delta[:n] += log_emission_by_obs[obs[positions]]
+
+    # Every row of delta stopped being updated at the end of its sequence
+    # (empty sequences, sorted last, have no row).
+    n = n_active[0]
+    ends = starts[:n] + np.diff(np.asarray(offsets))[order[:n]] - 1
+    x[ends] = np.argmax(delta, axis=1)
+    log_probs[order[:n]] = np.max(delta, axis=1)
+    for t in reversed(range(1, len(n_active))):
+        positions = starts[:n_active[t]] + t
+        x[positions - 1] = T2[positions, x[positions]]
+    return x, log_probs
@@ -0,0 +1,190 @@
+import numpy as np
+from scipy import sparse
+
+from forward import emission_matrix
+
+
+def _ranges(starts, ends):
+    """
+    Returns the concatenation of range(start, end) for every pair, along
+    with the index of the pair each value comes from.
+    """
+    counts = ends - starts
+    owners = np.repeat(np.arange(len(starts)), counts)
+    offsets = np.cumsum(counts) - counts
+    return starts[owners] + np.arange(counts.sum()) - offsets[owners], owners
+
+
+def _prune(scores, beam_width, threshold):
+    """
+    Returns the sorted indices of the scores to keep: those within
+    `threshold` of the best score, and at most the `beam_width` best of
+    them.
+    """
+    keep = np.isfinite(scores)
+    if threshold is not None and keep.any():
+        keep &= scores >= scores[keep].max() - threshold
+    kept = np.flatnonzero(keep)
+    if beam_width is not None and len(kept) > beam_width:
+        best = np.argpartition(-scores[kept], beam_width - 1)[:beam_width]
+        kept = np.sort(kept[best])
+    return kept
+
+
+def beam_viterbi(obs, transition, emission, init=None, beam_width=None,
+                 threshold=None):
+    """
+    Return the MAP estimate of state trajectory of Hidden Markov Model,
+    computed in log space with beam pruning.
+
+    Only the states of the beam are expanded at every step, following the
+    stored entries of a sparse transition matrix, so a step costs
+    O(transitions out of the beam) instead of O(K^2). Without pruning
+    (`beam_width` and `threshold` both None) the result is exactly the
+    one of `viterbi_log`.
+
+    Parameters
+    ----------
+    obs : array (T,)
+        Observation state sequence. int dtype.
+
+    transition : array (K, K) or scipy.sparse matrix
+        State transition matrix.
+
+    emission : array (K, M) or (M,)
+        Emission matrix, see `forward_scaled`.
+
+    init: optional, (K,)
+        Initial state probabilities. If None, uniform initial distribution
+        is assumed.
+
+    beam_width: int, optional
+        The maximum number of states kept at every step.
+
+    threshold: float, optional
+        Only the states whose log probability is within threshold of the
+        best one are kept at every step.
+
+    Returns
+    -------
+    x : array (T,)
+        The (approximate) most likely state trajectory.
+
+    log_prob : float
+        The log probability of x and the observations.
+    """
+    obs = np.asarray(obs)
+    transition = sparse.csr_matrix(transition, copy=True)
+    transition.eliminate_zeros()
+    transition.sort_indices()
+    K = transition.shape[0]
+    init = init if init is not None else np.full(K, 1 / K)
+    with np.errstate(divide='ignore'):
+        log_probabilities = np.log(transition.data)
+        log_emission_by_obs = np.log(np.ascontiguousarray(
+            emission_matrix(emission, K).T))
+        log_init = np.log(np.asarray(init, dtype=np.float64))
+
+    T = len(obs)
+    x = np.empty(T, np.min_scalar_type(K - 1))
+    if not T:
+        return x, 0.
+    # The (sorted) states of the beam at every step, and the previous
+    # state of the best path ending in each of them.
+    beams = [None] * T
+    backpointers = [None] * T
+
+    scores = log_init + log_emission_by_obs[obs[0]]
+    kept = _prune(scores, beam_width, threshold)
+    states, scores = kept, scores[kept]
+    beams[0] = states
+    for i in range(1, T):
+        if not len(states):
+            break
+        positions, owners = _ranges(transition.indptr[states],
+                                    transition.indptr[states + 1])
+        targets = transition.indices[positions]
+        candidates = scores[owners] + log_probabilities[positions]
+        # Best candidate for every target; ties go to the smallest
+        # previous state, like np.argmax in `viterbi_log`.
+        order = np.lexsort((owners, -candidates, targets))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = targets[order[1:]] != targets[order[:-1]]
+        best = order[first]
+
+        candidate_states = targets[best]
+        candidate_scores = (candidates[best] +
+                            log_emission_by_obs[obs[i], candidate_states])
+        kept = _prune(candidate_scores, beam_width, threshold)
+        backpointers[i] = states[owners[best][kept]]
+        states, scores = candidate_states[kept], candidate_scores[kept]
+        beams[i] = states
+    if not len(states):
+        raise ValueError("The observations have probability 0 under the "
+                         "model, or the beam lost every path.")
+
+    x[-1] = states[np.argmax(scores)]
+    for i in reversed(range(1, T)):
+        x[i - 1] = backpointers[i][np.searchsorted(beams[i], x[i])]
+    return x, scores.max()
+
+
+def beam_pruning_report(sequences, transition, emission, init=None,
+                        beam_width=None, threshold=None):
+    """
+    Compares beam pruned decoding to exact decoding on a set of sequences,
+    to tune the beam against accuracy.
+
+    The exact paths are computed with `beam_viterbi` without pruning,
+    which gives the same result as `viterbi_log` using the sparse
+    transitions.
+
+    Parameters
+    ----------
+    sequences : list of array (T,)
+        The observation sequences.
+
+    transition, emission, init, beam_width, threshold:
+        See `beam_viterbi`.
+
+    Returns
+    -------
+    dict:
+        n_sequences: the number of sequences decoded.
+        n_changed: the number of sequences whose path changed.
+        changed_fraction: n_changed / n_sequences.
+        state_error_rate: the fraction of all the states that changed.
+        mean_log_prob_loss: the mean log probability lost per sequence.
+        n_failed: the number of sequences for which the beam lost every
+            path (counted as changed).
+    """
+    transition = sparse.csr_matrix(transition)
+    n_changed = n_failed = n_states = n_wrong_states = 0
+    log_prob_loss = 0.
+    for obs in sequences:
+        exact_x, exact_log_prob = beam_viterbi(obs, transition, emission,
+                                               init)
+        n_states += len(exact_x)
+        try:
+            x, log_prob = beam_viterbi(obs, transition, emission, init,
+                                       beam_width, threshold)
+        except ValueError:
+            n_failed += 1
+            n_changed += 1
+            n_wrong_states += len(exact_x)
+            continue
+        wrong = np.count_nonzero(x != exact_x)
+        n_changed += int(wrong > 0)
+        n_wrong_states += wrong
+        log_prob_loss += float(exact_log_prob - log_prob)
+
+    n_sequences = len(sequences)
+    n_decoded = n_sequences - n_failed
+    return {
+        'n_sequences': n_sequences,
+        'n_changed': n_changed,
+        'changed_fraction': n_changed / n_sequences if n_sequences else 0.,
+        'state_error_rate': n_wrong_states / n_states if n_states else 0.,
+        'mean_log_prob_loss': log_prob_loss / n_decoded if n_decoded else 0.,
+        'n_failed': n_failed,
+    }
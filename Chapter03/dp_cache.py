@@ -0,0 +1,179 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+from scipy import sparse
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions',
+                                     'n_entries', 'n_bytes'])
+
+# Rough size of a cache entry without its arrays.
+_ENTRY_BYTES = 200
+
+
+def _arrays(value):
+    """
+    Returns the numpy arrays held by a result (an array, a sparse matrix,
+    a float or a tuple of them).
+    """
+    if isinstance(value, tuple):
+        return [array for item in value for array in _arrays(item)]
+    if sparse.issparse(value):
+        value = sparse.csr_matrix(value)
+        return [value.data, value.indices, value.indptr]
+    if isinstance(value, np.ndarray):
+        return [value]
+    return []
+
+
+def fingerprint(*arrays):
+    """
+    Returns a digest of the content of the given arrays (dense, sparse or
+    None), used to recognize the same model parameters or observations.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        if array is None:
+            digest.update(b'none;')
+            continue
+        if sparse.issparse(array):
+            array = sparse.csr_matrix(array)
+            array.sum_duplicates()
+            array.sort_indices()
+            digest.update(b'sparse;')
+            parts = [array.data, array.indices, array.indptr]
+        else:
+            parts = [np.asarray(array)]
+        for part in parts:
+            part = np.ascontiguousarray(part)
+            digest.update('{};{};'.format(part.dtype.str,
+                                          part.shape).encode())
+            digest.update(part.data if part.size else b'')
+    return digest.hexdigest()
+
+
+def make_key(name, obs, parameters, options=(), model_fingerprint=None):
+    """
+    Returns the cache key of a call.
+
+    Parameters
+    ----------
+    name: str
+        The function called.
+
+    obs: 1D array-like
+        The observations.
+
+    parameters: tuple
+        The model parameters (transition, emission, init).
+
+    options: tuple
+        The other (hashable) arguments that change the result.
+
+    model_fingerprint: str, optional
+        The `fingerprint` of the parameters, if already known. Hashing
+        large parameters on every call can cost more than a cache hit
+        saves, so callers running many sequences through the same model
+        should compute it once and pass it instead.
+    """
+    obs = np.asarray(obs)
+    if obs.dtype.kind in 'biu':
+        # The same observations given as a list or as any int array.
+        obs = obs.astype(np.int64, copy=False)
+    if model_fingerprint is None:
+        model_fingerprint = fingerprint(*parameters)
+    return (name, model_fingerprint, fingerprint(obs), tuple(options))
+
+
+class DPCache(object):
+    def __init__(self, max_entries=1024, max_bytes=None):
+        """
+        Bounded, thread safe memo cache for the results of the dynamic
+        programming algorithms (forward, backward, Viterbi).
+
+        Results are keyed by the function, a fingerprint of the model
+        parameters (which callers can compute once and pass along) and of
+        the observations (see `make_key`), and the least recently used ones
+        are evicted once there are more than `max_entries` of them or they
+        hold more than `max_bytes`.
+
+        The cached arrays are made read only, as they are shared by every
+        caller getting them. Two threads missing the same key at the same
+        time both compute it; the computation runs outside of the lock.
+
+        Parameters
+        ----------
+        max_entries: int
+            The maximum number of results kept.
+
+        max_bytes: int, optional
+            The maximum total size of the arrays kept.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        Drops all the results and resets the counters.
+        """
+        with self._lock:
+            self._entries = OrderedDict()
+            self._n_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def info(self):
+        """
+        Returns the hit, miss and eviction counters and the current size of
+        the cache as a CacheInfo.
+        """
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.evictions,
+                             len(self._entries), self._n_bytes)
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns the result cached for key, or computes it with `compute()`
+        and caches it.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        value = compute()
+        arrays = _arrays(value)
+        for array in arrays:
+            array.flags.writeable = False
+        n_bytes = _ENTRY_BYTES + sum(array.nbytes for array in arrays)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value, n_bytes
+                self._n_bytes += n_bytes
+                self._evict()
+        return value
+
+    def _evict(self):
+        """
+        Drops the least recently used results until the cache fits its
+        bounds (the newest result is always kept).
+        """
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or
+                (self.max_bytes is not None and
+                 self._n_bytes > self.max_bytes)):
+            _, (_, n_bytes) = self._entries.popitem(last=False)
+            self._n_bytes -= n_bytes
+            self.evictions += 1
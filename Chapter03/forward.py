@@ -1,6 +1,10 @@
 import numpy as np
+from scipy import sparse
 
-transition_matrix = 
+from dp_cache import make_key
+from sparse_kernels import choose_transition
+
+transition_matrix = \
     np.array([[0.33, 0.33,    0,    0,    0, 0.33,    0,    0,    0,    0,    0,    0,    0],
               [0.33, 0.33, 0.33,    0,    0,    0,    0,    0,    0,    0,    0,    0,    0],
               [   0, 0.25, 0.25, 0.25,    0,    0, 0.25,    0,    0,    0,    0,    0,    0],
@@ -20,7 +24,8 @@ emission = np.array([1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0, 1.0, 0.0, 0.0, 0.0,
 init_prob = np.array([0.077, 0.077, 0.077, 0.077, 0.077, 0.077, 0.077,
                       0.077, 0.077, 0.077, 0.077, 0.077, 0.077])
 
-def forward(obs, transition, emission, init):
+def forward(obs, transition, emission, init, cache=None,
+            model_fingerprint=None):
     """
     Runs forward algorithm on the HMM.
 
@@ -41,15 +46,28 @@ def forward(obs, transition, emission, init):
                 The initial probability of HMM.
                 size = {n_states}
 
+    cache:      dp_cache.DPCache, optional
+                If given, the result is looked up in (and added to) this
+                cache, keyed by the model parameters and obs.
+
+    model_fingerprint: str, optional
+                The `dp_cache.fingerprint` of (transition, emission, init),
+                so the parameters aren't hashed again on every cached call.
+
     Returns
     -------
     float: Probability value for the obs to occur.
     """
+    if cache is not None:
+        return cache.get_or_compute(
+            make_key('forward', obs, (transition, emission, init),
+                     model_fingerprint=model_fingerprint),
+            lambda: forward(obs, transition, emission, init))
     n_states = transition.shape[0]
     fwd = [{}]
 
     for i in range(n_states):
-        fwd[0][y] = init[i] * emission[obs[0]]
+        fwd[0][i] = init[i] * emission[obs[0]]
     for t in range(1, len(obs)):
         fwd.append({})
         for i in range(n_states):
@@ -57,3 +75,118 @@ def forward(obs, transition, emission, init):
                                     range(n_states))
     prob = sum((fwd[len(obs) - 1][s]) for s in range(n_states))
     return prob
+
+
+def emission_matrix(emission, n_states):
+    """
+    Returns the emission probabilities as a 2-D array, B[i, o] being the
+    probability of observing o in state i.
+
+    Parameters
+    ----------
+    emission:   1D or 2D array-like
+                Either the full emission matrix of size
+                {n_states x n_observations}, or a 1D array indexed by the
+                observation only (the same for every state), as used by
+                `forward`.
+
+    n_states:   int
+                The number of states of the HMM.
+    """
+    emission = np.asarray(emission, dtype=np.float64)
+    if emission.ndim == 1:
+        return np.broadcast_to(emission, (n_states, len(emission)))
+    return emission
+
+
+def forward_scaled(obs, transition, emission, init, return_alpha=False,
+                   cache=None, model_fingerprint=None):
+    """
+    Runs the scaled forward algorithm on the HMM.
+
+    Every time step is a single vector-matrix product, and alpha is
+    normalized to sum to 1 after each step so long sequences don't
+    underflow. The scaling factors give the log-likelihood. Sparse enough
+    transition matrices (see `sparse_kernels.choose_transition`) are
+    multiplied in CSR format, in O(nnz) per step.
+
+    Parameters
+    ----------
+    obs:        1D list, array-like
+                The list of observed states.
+
+    transition: 2D array-like or scipy.sparse matrix
+                The transition probability of the HMM.
+                size = {n_states x n_states}
+
+    emission:   1D or 2D array-like
+                The emission probabiltiy of the HMM, either a full matrix
+                of size {n_states x n_observations} or a 1D array as for
+                `forward`.
+
+    init:       1D array-like
+                The initial probability of HMM.
+                size = {n_states}
+
+    return_alpha: bool
+                If True, the scaled alpha matrix and the scaling factors
+                are returned as well.
+
+    cache:      dp_cache.DPCache, optional
+                If given, the result is looked up in (and added to) this
+                cache, keyed by the model parameters and obs.
+
+    model_fingerprint: str, optional
+                The `dp_cache.fingerprint` of (transition, emission, init),
+                so the parameters aren't hashed again on every cached call.
+
+    Returns
+    -------
+    float: The log probability of the obs.
+
+    alpha:  2D array, size = {n_obs x n_states}
+            Only if return_alpha. alpha[t, i] is the probability of being
+            in state i at time t given obs[:t + 1].
+
+    scales: 1D array, size = {n_obs}
+            Only if return_alpha. scales[t] is the probability of obs[t]
+            given obs[:t].
+    """
+    if cache is not None:
+        return cache.get_or_compute(
+            make_key('forward_scaled', obs, (transition, emission, init),
+                     (return_alpha,), model_fingerprint),
+            lambda: forward_scaled(obs, transition, emission, init,
+                                   return_alpha))
+    obs = np.asarray(obs)
+    transition = choose_transition(transition)
+    # transition_T @ alpha is alpha @ transition, in CSR format for sparse
+    # transitions.
+    transition_T = (transition.T.tocsr() if sparse.issparse(transition)
+                    else transition.T)
+    n_states = transition.shape[0]
+    # Rows of the transposed emission matrix are contiguous.
+    emission_by_obs = np.ascontiguousarray(
+        emission_matrix(emission, n_states).T)
+    T = len(obs)
+
+    scales = np.zeros(T)
+    alpha = np.zeros((T, n_states)) if return_alpha else None
+    alpha_t = np.asarray(init, dtype=np.float64) * emission_by_obs[obs[0]]
+    for t in range(T):
+        if t:
+            alpha_t = (transition_T @ alpha_t) * emission_by_obs[obs[t]]
+        scale = alpha_t.sum()
+        if scale <= 0:
+            # obs can't occur, the remaining alphas are left at 0.
+            break
+        alpha_t /= scale
+        scales[t] = scale
+        if return_alpha:
+            alpha[t] = alpha_t
+
+    with np.errstate(divide='ignore'):
+        log_prob = np.log(scales).sum()
+    if return_alpha:
+        return log_prob, alpha, scales
+    return log_prob
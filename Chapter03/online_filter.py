@@ -0,0 +1,137 @@
+import numpy as np
+from scipy import sparse
+
+from forward import emission_matrix
+from sparse_kernels import choose_transition
+
+
+class ForwardFilter(object):
+    def __init__(self, transition, emission, init):
+        """
+        Online forward filter: the scaled forward recursion of
+        `forward_scaled`, extended one observation at a time.
+
+        The filter holds the scaled alpha vector (the state distribution
+        given the observations so far) and the log-likelihood of these
+        observations, and updates both in O(K^2) per observation (O(nnz)
+        for sparse transitions) instead of rerunning the forward algorithm
+        over the whole history.
+
+        Parameters
+        ----------
+        transition: 2D array-like or scipy.sparse matrix
+                    The transition probability of the HMM.
+                    size = {n_states x n_states}
+
+        emission:   1D or 2D array-like
+                    The emission probabiltiy of the HMM, see
+                    `forward_scaled`.
+
+        init:       1D array-like
+                    The initial probability of HMM.
+                    size = {n_states}
+        """
+        transition = choose_transition(transition)
+        self._transition_T = (transition.T.tocsr()
+                              if sparse.issparse(transition)
+                              else transition.T)
+        n_states = transition.shape[0]
+        self._emission_by_obs = np.ascontiguousarray(
+            emission_matrix(emission, n_states).T)
+        self._init = np.asarray(init, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        """
+        Starts filtering a new sequence.
+        """
+        self._alpha = None
+        self.log_prob = 0.
+        self.n_observations = 0
+
+    @property
+    def alpha(self):
+        """
+        The probability of every state given the observations so far, None
+        before the first observation.
+        """
+        return self._alpha
+
+    def predict(self):
+        """
+        Returns the probability of every state at the next time step,
+        given the observations so far.
+        """
+        if self._alpha is None:
+            return self._init
+        return self._transition_T @ self._alpha
+
+    def update(self, observation):
+        """
+        Appends one observation to the sequence.
+
+        Parameters
+        ----------
+        observation: int
+            The next observation.
+
+        Returns
+        -------
+        float: The log probability of the observation given the previous
+               ones. log_prob is increased by this amount.
+        """
+        alpha = self.predict() * self._emission_by_obs[observation]
+        scale = alpha.sum()
+        if scale <= 0:
+            # The state is left unchanged, so the caller can go on with
+            # another observation.
+            raise ValueError("The observation has probability 0 under the "
+                             "model.")
+        # A new array on every update, so snapshots can share it.
+        self._alpha = alpha / scale
+        log_scale = np.log(scale)
+        self.log_prob += log_scale
+        self.n_observations += 1
+        return log_scale
+
+    def extend(self, observations):
+        """
+        Appends several observations to the sequence.
+
+        Returns
+        -------
+        float: The log probability of the observations given the previous
+               ones.
+        """
+        return sum(self.update(observation) for observation in observations)
+
+    def score_candidates(self, observations):
+        """
+        Returns the log probability of every candidate next observation
+        given the observations so far, without changing the filter.
+
+        Parameters
+        ----------
+        observations: 1D array-like of int
+            The candidate observations.
+
+        Returns
+        -------
+        1D array: log P(observations[i] | observations so far) for every i.
+        """
+        candidates = self._emission_by_obs[np.asarray(observations)]
+        with np.errstate(divide='ignore'):
+            return np.log(candidates @ self.predict())
+
+    def snapshot(self):
+        """
+        Returns the current state of the filter, to go back to it with
+        `restore`. Taking a snapshot costs O(1).
+        """
+        return self._alpha, self.log_prob, self.n_observations
+
+    def restore(self, snapshot):
+        """
+        Goes back to a state returned by `snapshot`.
+        """
+        self._alpha, self.log_prob, self.n_observations = snapshot
@@ -0,0 +1,161 @@
+import os
+from collections import deque
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+from scipy import sparse
+
+from sparse_kernels import LogTransitionColumns, choose_transition
+from viterbi import log_parameters, viterbi_log_decode
+
+# Model parameters of a worker process, attached once by `_init_worker`.
+_worker_parameters = None
+_worker_blocks = []
+
+
+def _share(array):
+    """
+    Copies an array into a new shared memory block.
+
+    Returns the block, to be closed and unlinked by the caller, and the
+    description a worker needs to attach it.
+    """
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True,
+                                       size=max(1, array.nbytes))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return block, (block.name, array.shape, array.dtype.str)
+
+
+def _attach(description):
+    """
+    Returns a read only view of an array shared by `_share`.
+    """
+    name, shape, dtype = description
+    block = shared_memory.SharedMemory(name=name)
+    # The view is only valid as long as the block is open.
+    _worker_blocks.append(block)
+    array = np.ndarray(shape, dtype, buffer=block.buf)
+    array.flags.writeable = False
+    return array
+
+
+def _init_worker(descriptions, n_states, checkpoint):
+    """
+    Attaches the shared model parameters in a worker process.
+    """
+    global _worker_parameters
+    arrays = {key: _attach(description)
+              for key, description in descriptions.items()}
+    if 'log_transition_T' in arrays:
+        log_transition_T = arrays['log_transition_T']
+    else:
+        # The sparse layout is O(nnz), cheap to rebuild once per worker.
+        log_transition_T = LogTransitionColumns(sparse.csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']),
+            shape=(n_states, n_states)))
+    _worker_parameters = (log_transition_T, arrays['log_emission_by_obs'],
+                          arrays['log_init'], checkpoint)
+
+
+def _decode_chunk(chunk):
+    """
+    Decodes a chunk of sequences in a worker process.
+    """
+    log_transition_T, log_emission_by_obs, log_init, checkpoint = \
+        _worker_parameters
+    return [viterbi_log_decode(obs, log_transition_T, log_emission_by_obs,
+                               log_init, checkpoint=checkpoint)
+            for obs in chunk]
+
+
+def _chunks(sequences, chunk_size):
+    """
+    Groups an iterable of sequences into lists of chunk_size sequences.
+    """
+    chunk = []
+    for obs in sequences:
+        chunk.append(np.asarray(obs))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def viterbi_parallel(sequences, transition, emission, init=None, n_jobs=None,
+                     chunk_size=64, checkpoint=False):
+    """
+    Decodes many sequences with `viterbi_log` on a pool of processes.
+
+    The log space model parameters are computed once and placed in shared
+    memory, which every worker attaches when it starts, so only the
+    sequences and the decoded paths go through the pipes. The sequences
+    are sent in chunks of `chunk_size`, with at most two chunks per worker
+    in flight: the input is consumed lazily and the results are streamed
+    back in order.
+
+    Parameters
+    ----------
+    sequences : iterable of array (T,)
+        The observation sequences. int dtype.
+
+    transition : array (K, K) or scipy.sparse matrix
+        State transition matrix.
+
+    emission : array (K, M) or (M,)
+        Emission matrix, see `forward_scaled`.
+
+    init: optional, (K,)
+        Initial state probabilities. If None, uniform initial distribution
+        is assumed.
+
+    n_jobs: int, optional
+        The number of worker processes, os.cpu_count() if None.
+
+    chunk_size: int
+        The number of sequences sent to a worker at once.
+
+    checkpoint: bool or int
+        See `viterbi_log`.
+
+    Yields
+    ------
+    (x, log_prob) for every sequence, in order, see `viterbi_log`.
+    """
+    transition = choose_transition(transition)
+    log_transition_T, log_emission_by_obs, log_init = log_parameters(
+        transition, emission, init)
+    arrays = {'log_emission_by_obs': log_emission_by_obs,
+              'log_init': log_init}
+    if sparse.issparse(transition):
+        arrays.update(data=transition.data, indices=transition.indices,
+                      indptr=transition.indptr)
+    else:
+        arrays['log_transition_T'] = log_transition_T
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    blocks = []
+    pool = None
+    try:
+        descriptions = {}
+        for key, array in arrays.items():
+            block, descriptions[key] = _share(array)
+            blocks.append(block)
+        pool = Pool(n_jobs, initializer=_init_worker,
+                    initargs=(descriptions, len(log_init), checkpoint))
+        max_pending = 2 * n_jobs
+        pending = deque()
+        for chunk in _chunks(sequences, chunk_size):
+            pending.append(pool.apply_async(_decode_chunk, (chunk,)))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        for block in blocks:
+            block.close()
+            block.unlink()
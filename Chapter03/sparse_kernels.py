@@ -0,0 +1,79 @@
+import numpy as np
+from scipy import sparse
+
+# Transition matrices with a smaller fraction of nonzero entries are run
+# through the sparse kernels.
+DENSITY_THRESHOLD = 0.1
+
+
+def choose_transition(transition, density_threshold=None):
+    """
+    Returns the transition matrix in the format the kernels should use: a
+    CSR matrix if it is sparse enough, a dense array otherwise.
+
+    Parameters
+    ----------
+    transition: 2D array-like or scipy.sparse matrix
+        The transition probability of the HMM.
+
+    density_threshold: float, optional
+        The maximum fraction of nonzero entries for the sparse kernels to
+        be used. Defaults to DENSITY_THRESHOLD.
+    """
+    if density_threshold is None:
+        density_threshold = DENSITY_THRESHOLD
+    if sparse.issparse(transition):
+        n_entries = np.prod(transition.shape)
+        if transition.nnz <= density_threshold * n_entries:
+            transition = sparse.csr_matrix(transition, copy=True)
+            transition.eliminate_zeros()
+            transition.sort_indices()
+            return transition
+        return transition.toarray()
+    transition = np.asarray(transition, dtype=np.float64)
+    if np.count_nonzero(transition) <= density_threshold * transition.size:
+        return choose_transition(sparse.csr_matrix(transition), 1.)
+    return transition
+
+
+class LogTransitionColumns(object):
+    def __init__(self, transition):
+        """
+        Log transition matrix stored column by column (CSC), for the
+        sparse Viterbi step: the best predecessor of state j is a max over
+        the stored entries of column j.
+
+        Parameters
+        ----------
+        transition: scipy.sparse matrix
+            The transition probability of the HMM.
+        """
+        columns = sparse.csc_matrix(transition, copy=True)
+        columns.eliminate_zeros()
+        columns.sort_indices()
+        self.n_states = columns.shape[0]
+        self.rows = columns.indices
+        self.log_probabilities = np.log(columns.data)
+        counts = np.diff(columns.indptr)
+        self._has_entries = counts > 0
+        self._starts = columns.indptr[:-1][self._has_entries]
+        self._counts = counts[self._has_entries]
+
+    def step(self, delta, log_emission):
+        """
+        Runs one step of the log space Viterbi recursion in O(nnz), see
+        `viterbi.viterbi_step`.
+        """
+        scores = delta[self.rows] + self.log_probabilities
+        best_scores = np.maximum.reduceat(scores, self._starts)
+        # Rows are sorted within every column, so the first maximum of a
+        # column is its smallest predecessor, as with np.argmax.
+        is_best = np.flatnonzero(
+            scores == np.repeat(best_scores, self._counts))
+        first_best = is_best[np.searchsorted(is_best, self._starts)]
+
+        new_delta = np.full(self.n_states, -np.inf)
+        new_delta[self._has_entries] = best_scores
+        backpointers = np.zeros(self.n_states, dtype=np.intp)
+        backpointers[self._has_entries] = self.rows[first_best]
+        return new_delta + log_emission, backpointers
@@ -0,0 +1,195 @@
+from collections import deque
+
+import numpy as np
+
+from viterbi import log_parameters, viterbi_step
+
+
+class StreamingViterbi(object):
+    # The scores are shifted back to 0 once they drift this far, so they
+    # keep their precision on unbounded streams.
+    rescale_threshold = 1e6
+
+    def __init__(self, transition, emission, init=None, max_lag=None):
+        """
+        Online Viterbi decoder for unbounded observation streams.
+
+        Observations are pushed one at a time through the same recursion
+        as `viterbi_log`. A state is emitted as soon as it is decided,
+        i.e. as soon as all the surviving paths go through it, so on a
+        finite stream the emitted states followed by `flush` are exactly
+        the output of `viterbi_log`. Only the backpointers of the
+        undecided steps are kept.
+
+        Parameters
+        ----------
+        transition : array (K, K)
+            State transition matrix.
+
+        emission : array (K, M) or (M,)
+            Emission matrix, see `forward_scaled`.
+
+        init: optional, (K,)
+            Initial state probabilities. If None, uniform initial
+            distribution is assumed.
+
+        max_lag: int, optional
+            If given, at most max_lag steps are left undecided: when the
+            paths haven't merged after max_lag steps, the oldest state of
+            the currently best path is emitted. This bounds the memory,
+            but the emitted states may then differ from `viterbi_log`.
+        """
+        self._log_transition_T, self._log_emission_by_obs, self._log_init = \
+            log_parameters(transition, emission, init)
+        self.max_lag = max_lag
+        self.reset()
+
+    def reset(self):
+        """
+        Starts decoding a new stream.
+        """
+        self._delta = None
+        self._offset = 0.
+        # Backpointers of the steps after the oldest undecided one.
+        self._backpointers = deque()
+        self.n_observations = 0
+        self.n_decided = 0
+
+    @property
+    def lag(self):
+        """
+        The number of steps that are still undecided.
+        """
+        return self.n_observations - self.n_decided
+
+    @property
+    def log_prob(self):
+        """
+        The log probability of the best path so far.
+        """
+        return self._delta.max() + self._offset
+
+    def push(self, observation):
+        """
+        Decodes one more observation.
+
+        Parameters
+        ----------
+        observation: int
+            The next observation.
+
+        Returns
+        -------
+        x : array
+            The states decided thanks to this observation, following the
+            states returned so far.
+        """
+        log_emission = self._log_emission_by_obs[observation]
+        if self._delta is None:
+            self._delta = self._log_init + log_emission
+        else:
+            self._delta, backpointers = viterbi_step(
+                self._delta, self._log_transition_T, log_emission)
+            if self.n_observations > self.n_decided:
+                self._backpointers.append(
+                    backpointers.astype(np.min_scalar_type(len(self._delta))))
+        self.n_observations += 1
+
+        best = self._delta.max()
+        if not np.isfinite(best):
+            raise ValueError("The observations have probability 0 under the "
+                             "model.")
+        if abs(best) > self.rescale_threshold:
+            self._delta -= best
+            self._offset += best
+
+        decided = self._merged_states()
+        if self.max_lag is not None and self.lag > self.max_lag:
+            forced = self._best_path()[:self.lag - self.max_lag]
+            self._decide(forced)
+            decided = np.concatenate([decided, forced])
+        return decided
+
+    def extend(self, observations):
+        """
+        Decodes several more observations.
+
+        Parameters
+        ----------
+        observations: 1-D array-like
+            The next observations.
+
+        Returns
+        -------
+        x : array
+            The states decided thanks to these observations.
+        """
+        decided = [self.push(observation) for observation in observations]
+        if not decided:
+            return np.empty(0, np.min_scalar_type(len(self._log_init)))
+        return np.concatenate(decided)
+
+    def flush(self):
+        """
+        Ends the stream: decides all the remaining states from the best
+        final state, and resets the decoder.
+
+        Returns
+        -------
+        x : array
+            The remaining states.
+        """
+        if not self.lag:
+            remaining = np.empty(0, np.min_scalar_type(len(self._log_init)))
+        else:
+            remaining = self._best_path()
+        self.reset()
+        return remaining
+
+    def _best_path(self):
+        """
+        Returns the undecided part of the path ending in the best state.
+        """
+        return self._trace(int(np.argmax(self._delta)),
+                           len(self._backpointers))
+
+    def _trace(self, state, n_backpointers):
+        """
+        Returns the states from the oldest undecided step to the one
+        reached from `state` after following `n_backpointers` backpointers
+        (oldest first).
+        """
+        path = np.empty(n_backpointers + 1,
+                        np.min_scalar_type(len(self._delta)))
+        path[-1] = state
+        for i in reversed(range(n_backpointers)):
+            state = self._backpointers[i][state]
+            path[i] = state
+        return path
+
+    def _merged_states(self):
+        """
+        Decides and returns the states every surviving path goes through.
+        """
+        states = np.flatnonzero(np.isfinite(self._delta))
+        # Follow all the surviving paths back from the newest step until
+        # they merge, in which case every step before is decided too.
+        n_backpointers = len(self._backpointers)
+        while np.any(states != states[0]):
+            if not n_backpointers:
+                return np.empty(0, np.min_scalar_type(len(self._delta)))
+            n_backpointers -= 1
+            states = np.unique(self._backpointers[n_backpointers][states])
+        decided = self._trace(states[0], n_backpointers)
+        self._decide(decided)
+        return decided
+
+    def _decide(self, decided):
+        """
+        Drops the backpointers leading to the decided states.
+        """
+        self.n_decided += len(decided)
+        # The backpointers of the new oldest undecided step only lead to
+        # decided states, drop them too.
+        for _ in range(min(len(decided), len(self._backpointers))):
+            self._backpointers.popleft()
@@ -1,6 +1,12 @@
 import numpy as np
+from scipy import sparse
 
-def viterbi(obs, transition, emission, init=None):
+from dp_cache import make_key
+from forward import emission_matrix
+from sparse_kernels import LogTransitionColumns, choose_transition
+
+def viterbi(obs, transition, emission, init=None, cache=None,
+            model_fingerprint=None):
     """
     Return the MAP estimate of state trajectory of Hidden Markov Model.
 
@@ -20,6 +26,14 @@ def viterbi(obs, transition, emission, init=None):
         Initial state probabilities: Pi[i] is the probability x[0] == i. If
         None, uniform initial distribution is assumed (Pi[:] == 1/K).
 
+    cache: dp_cache.DPCache, optional
+        If given, the result is looked up in (and added to) this cache,
+        keyed by the model parameters and obs.
+
+    model_fingerprint: str, optional
+        The `dp_cache.fingerprint` of (transition, emission, init), so the
+        parameters aren't hashed again on every cached call.
+
     Returns
     -------
     x : array (T,)
@@ -32,6 +46,11 @@ def viterbi(obs, transition, emission, init=None):
     T2: array (K, T)
         the x_j-1 of the most likely path so far
     """
+    if cache is not None:
+        return cache.get_or_compute(
+            make_key('viterbi', obs, (transition, emission, init),
+                     model_fingerprint=model_fingerprint),
+            lambda: viterbi(obs, transition, emission, init))
     # Cardinality of the state space
     K = transition.shape[0]
 
@@ -59,3 +78,190 @@ def viterbi(obs, transition, emission, init=None):
         x[i - 1] = T2[x[i], i]
 
     return x, T1, T2
+
+
+def log_parameters(transition, emission, init=None):
+    """
+    Returns the HMM parameters in the log space layout used by the log
+    space decoders.
+
+    Sparse enough transition matrices (see
+    `sparse_kernels.choose_transition`) are kept sparse.
+
+    Returns
+    -------
+    log_transition_T : array (K, K) or LogTransitionColumns
+        log(transition).T, contiguous so that the max over the previous
+        state runs along rows. For sparse transitions, the log transition
+        matrix stored by columns, which `viterbi_step` runs in O(nnz).
+
+    log_emission_by_obs : array (M, K)
+        log(emission).T, row o holds log P(o | state) for every state.
+
+    log_init : array (K,)
+        log(init), uniform if init is None.
+    """
+    transition = choose_transition(transition)
+    K = transition.shape[0]
+    init = init if init is not None else np.full(K, 1 / K)
+    with np.errstate(divide='ignore'):
+        if sparse.issparse(transition):
+            log_transition_T = LogTransitionColumns(transition)
+        else:
+            log_transition_T = np.ascontiguousarray(np.log(transition).T)
+        return (log_transition_T,
+                np.ascontiguousarray(np.log(emission_matrix(emission, K).T)),
+                np.log(np.asarray(init, dtype=np.float64)))
+
+
+def viterbi_step(delta, log_transition_T, log_emission):
+    """
+    Runs one step of the log space Viterbi recursion.
+
+    Parameters
+    ----------
+    delta : array (K,)
+        Log probability of the most likely path ending in every state at
+        the previous time step.
+
+    log_transition_T : array (K, K) or LogTransitionColumns
+        Transposed log transition matrix, see `log_parameters`.
+
+    log_emission : array (K,)
+        Log probability of the current observation in every state.
+
+    Returns
+    -------
+    delta : array (K,)
+        Log probability of the most likely path ending in every state.
+
+    backpointers : array (K,)
+        The previous state of the most likely path ending in every state.
+    """
+    if isinstance(log_transition_T, LogTransitionColumns):
+        return log_transition_T.step(delta, log_emission)
+    scores = delta + log_transition_T
+    backpointers = np.argmax(scores, axis=1)
+    return (scores[np.arange(len(delta)), backpointers] + log_emission,
+            backpointers)
+
+
+def viterbi_log(obs, transition, emission, init=None, checkpoint=False,
+                cache=None, model_fingerprint=None):
+    """
+    Return the MAP estimate of state trajectory of Hidden Markov Model,
+    computed in log space.
+
+    Unlike `viterbi`, long sequences don't underflow, every step is
+    computed once, and only the backpointers (in the smallest dtype able
+    to hold K states) are stored. With `checkpoint`, not even those are:
+    the scores are only kept every sqrt(T) steps and every segment is
+    recomputed during the traceback, so memory is O(sqrt(T) K) for twice
+    the work.
+
+    Parameters
+    ----------
+    obs : array (T,)
+        Observation state sequence. int dtype.
+
+    transition : array (K, K) or scipy.sparse matrix
+        State transition matrix. Sparse enough matrices are run through
+        the O(nnz) sparse kernel.
+
+    emission : array (K, M) or (M,)
+        Emission matrix, see `forward_scaled`.
+
+    init: optional, (K,)
+        Initial state probabilities. If None, uniform initial distribution
+        is assumed.
+
+    checkpoint: bool or int
+        If True, use checkpointing with segments of sqrt(T) steps. An int
+        gives the segment length directly.
+
+    cache: dp_cache.DPCache, optional
+        If given, the result is looked up in (and added to) this cache,
+        keyed by the model parameters and obs.
+
+    model_fingerprint: str, optional
+        The `dp_cache.fingerprint` of (transition, emission, init), so the
+        parameters aren't hashed again on every cached call.
+
+    Returns
+    -------
+    x : array (T,)
+        Maximum a posteriori probability estimate of hidden state trajectory,
+        conditioned on observation sequence y under the model parameters.
+
+    log_prob : float
+        The log probability of x and the observations.
+    """
+    if cache is not None:
+        # The checkpointing doesn't change the result.
+        return cache.get_or_compute(
+            make_key('viterbi_log', obs, (transition, emission, init),
+                     model_fingerprint=model_fingerprint),
+            lambda: viterbi_log(obs, transition, emission, init, checkpoint))
+    return viterbi_log_decode(
+        obs, *log_parameters(transition, emission, init),
+        checkpoint=checkpoint)
+
+
+def viterbi_log_decode(obs, log_transition_T, log_emission_by_obs, log_init,
+                       checkpoint=False):
+    """
+    Runs `viterbi_log` on parameters already in the layout returned by
+    `log_parameters`, so they can be computed (or shared) once for many
+    sequences.
+    """
+    obs = np.asarray(obs)
+    K = len(log_init)
+    T = len(obs)
+    x = np.empty(T, np.min_scalar_type(K - 1))
+    if not T:
+        return x, 0.
+
+    checkpointing = bool(checkpoint)
+    if checkpoint is True:
+        segment = max(1, int(np.ceil(np.sqrt(T))))
+    elif checkpointing:
+        segment = int(checkpoint)
+    else:
+        segment = T
+
+    # Forward pass, keeping the scores at the start of every segment.
+    checkpoints = np.empty(((T + segment - 1) // segment, K))
+    T2 = np.empty((segment, K), x.dtype)
+    delta = log_init + log_emission_by_obs[obs[0]]
+    checkpoints[0] = delta
+    for i in range(1, T):
+        delta, backpointers = viterbi_step(delta, log_transition_T,
+                                           log_emission_by_obs[obs[i]])
+        if i % segment == 0:
+            checkpoints[i // segment] = delta
+        elif not checkpointing:
+            T2[i] = backpointers
+
+    x[-1] = np.argmax(delta)
+    log_prob = delta[x[-1]]
+
+    # Traceback, segment by segment from the last one. Without
+    # checkpointing there is a single segment whose backpointers are
+    # already known.
+    for start in reversed(range(0, T, segment)):
+        end = min(T, start + segment)
+        if checkpointing:
+            delta = checkpoints[start // segment]
+            for i in range(start + 1, end):
+                delta, T2[i - start] = viterbi_step(
+                    delta, log_transition_T, log_emission_by_obs[obs[i]])
+        if end < T:
+            # Link to the segment after this one, whose first step starts
+            # from the last scores of this segment.
+            _, backpointers = viterbi_step(delta, log_transition_T,
+                                           log_emission_by_obs[obs[end]])
+            x[end - 1] = backpointers[x[end]]
+        for i in reversed(range(start + 1, end)):
+            x[i - 1] = T2[i - start, x[i]]
+
+    return x, log_prob
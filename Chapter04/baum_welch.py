@@ -0,0 +1,304 @@
+from __future__ import print_function
+
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+
+def forward_backward(frame_likelihood, lengths, startprob, transmat):
+    """
+    Runs the scaled forward-backward algorithm on a batch of sequences at
+    once.
+
+    The sequences are sorted by decreasing length and advanced together,
+    one matrix product per time step for the whole batch, so the Python
+    loop runs max(lengths) times instead of sum(lengths).
+
+    Parameters
+    ----------
+    frame_likelihood: 2-D array, shape (n_frames, n_states)
+        P(observation | state) for every frame of the concatenated
+        sequences, whatever the emission model.
+
+    lengths: 1-D array
+        The length of every sequence, summing to n_frames.
+
+    startprob: 1-D array, shape (n_states,)
+        The initial state probabilities.
+
+    transmat: 2-D array, shape (n_states, n_states)
+        The transition probabilities.
+
+    Returns
+    -------
+    log_prob: 1-D array
+        The log-likelihood of every sequence.
+
+    posteriors: 2-D array, shape (n_frames, n_states)
+        The probability of every state at every frame, given the sequence.
+
+    start_counts: 1-D array, shape (n_states,)
+        The expected number of sequences starting in every state.
+
+    transition_counts: 2-D array, shape (n_states, n_states)
+        The expected number of transitions between every pair of states,
+        summed over all the sequences.
+    """
+    lengths = np.asarray(lengths)
+    n_frames, n_states = frame_likelihood.shape
+    order = np.argsort(-lengths, kind='stable')
+    starts = (np.cumsum(lengths) - lengths)[order]
+    sorted_lengths = lengths[order]
+    max_length = sorted_lengths[0] if len(lengths) else 0
+    # The sequences still running at time t are the first n_active[t].
+    n_active = np.searchsorted(-sorted_lengths, -np.arange(max_length),
+                               side='left')
+
+    # Forward pass, keeping the scaled alpha of every frame.
+    posteriors = np.empty((n_frames, n_states))
+    scales = np.ones(n_frames)
+    alpha = None
+    for t, n in enumerate(n_active):
+        positions = starts[:n] + t
+        if t:
+            alpha = (alpha[:n] @ transmat) * frame_likelihood[positions]
+        else:
+            alpha = startprob * frame_likelihood[positions]
+        scale = alpha.sum(axis=1)
+        if np.any(scale <= 0):
+            raise ValueError("The observations have probability 0 under "
+                             "the model.")
+        alpha /= scale[:, np.newaxis]
+        scales[positions] = scale
+        posteriors[positions] = alpha
+
+    # Backward pass: beta stays 1 for the sequences that already ended.
+    transition_counts = np.zeros((n_states, n_states))
+    beta = np.ones((len(lengths), n_states))
+    for t in reversed(range(1, len(n_active))):
+        n = n_active[t]
+        positions = starts[:n] + t
+        weighted_beta = (frame_likelihood[positions] * beta[:n] /
+                         scales[positions, np.newaxis])
+        # posteriors still hold the scaled alpha of the previous frames.
+        transition_counts += posteriors[positions - 1].T @ weighted_beta
+        beta[:n] = weighted_beta @ transmat.T
+        posteriors[positions - 1] *= beta[:n]
+    transition_counts *= transmat
+    posteriors /= posteriors.sum(axis=1, keepdims=True)
+
+    sequence_ids = np.repeat(np.arange(len(lengths)), lengths)
+    log_prob = np.bincount(sequence_ids, weights=np.log(scales),
+                           minlength=len(lengths))
+    start_counts = posteriors[starts[sorted_lengths > 0]].sum(axis=0)
+    return log_prob, posteriors, start_counts, transition_counts
+
+
+def _expected_counts(obs, lengths, startprob, transmat, emissionprob):
+    """
+    Runs the E-step of a discrete HMM on a batch of sequences.
+
+    Returns the total log-likelihood and the expected start, transition
+    and emission counts.
+    """
+    n_states, n_symbols = emissionprob.shape
+    log_prob, posteriors, start_counts, transition_counts = \
+        forward_backward(emissionprob.T[obs], lengths, startprob, transmat)
+    # emission_counts[i, o] sums the posteriors of state i over the frames
+    # where o is observed.
+    cells = (obs[:, np.newaxis] * n_states + np.arange(n_states)).ravel()
+    emission_counts = np.bincount(cells, weights=posteriors.ravel(),
+                                  minlength=n_symbols * n_states)
+    return (log_prob.sum(), start_counts, transition_counts,
+            emission_counts.reshape(n_symbols, n_states).T)
+
+
+# Training data of a worker process, sent once by `_init_worker`.
+_worker_data = None
+
+
+def _init_worker(obs, lengths, offsets):
+    global _worker_data
+    _worker_data = obs, lengths, offsets
+
+
+def _expected_counts_chunk(task):
+    """
+    Runs the E-step on the sequences first:last of the worker data.
+    """
+    first, last, startprob, transmat, emissionprob = task
+    obs, lengths, offsets = _worker_data
+    return _expected_counts(obs[offsets[first]:offsets[last]],
+                            lengths[first:last], startprob, transmat,
+                            emissionprob)
+
+
+def _chunks(lengths, chunk_frames):
+    """
+    Splits the sequences into consecutive chunks of about chunk_frames
+    frames (at least one sequence each).
+
+    Returns the (first, last) sequence index of every chunk.
+    """
+    ends = np.cumsum(lengths)
+    bounds = [0]
+    while bounds[-1] < len(lengths):
+        start = ends[bounds[-1] - 1] if bounds[-1] else 0
+        last = np.searchsorted(ends, start + chunk_frames, side='right')
+        bounds.append(max(last, bounds[-1] + 1))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def normalize_rows(counts, previous):
+    """
+    Normalizes the counts to probabilities by row. Rows without any count
+    keep their previous probabilities.
+    """
+    totals = counts.sum(axis=-1, keepdims=True)
+    return np.where(totals > 0, counts / np.where(totals > 0, totals, 1),
+                    previous)
+
+
+class BaumWelch(object):
+    def __init__(self, n_iter=100, tol=1e-4, n_jobs=1, chunk_frames=2 ** 20,
+                 verbose=False):
+        """
+        Baum-Welch (EM) trainer for discrete HMMs on many sequences.
+
+        The parameters have the layout of `MultinomialHMM`, so the result
+        can be used to build one.
+
+        Every E-step is vectorized over the sequences and scaled (see
+        `forward_backward`). The sequences are split into chunks of about
+        `chunk_frames` frames, whose expected counts are computed on a
+        process pool and summed. The training data is sent to every worker
+        once, when the pool starts; every task only carries the chunk
+        bounds and the current parameters.
+
+        Parameters
+        ----------
+        n_iter: int
+            The maximum number of iterations.
+
+        tol: float
+            Training stops once the total log-likelihood improves by less
+            than tol.
+
+        n_jobs: int
+            The number of worker processes. With 1, everything runs in the
+            calling process.
+
+        chunk_frames: int
+            The approximate number of frames of a chunk, which bounds the
+            memory of the E-step to chunk_frames x n_states floats per
+            worker.
+
+        verbose: bool
+            If True, the log-likelihood, its improvement and the time of
+            every iteration are printed to stderr.
+        """
+        self.n_iter = n_iter
+        self.tol = tol
+        self.n_jobs = n_jobs
+        self.chunk_frames = chunk_frames
+        self.verbose = verbose
+
+    def fit(self, obs, lengths, prior_probabilities, transition_matrix,
+            emission_probabilities):
+        """
+        Trains the HMM from the given initial parameters.
+
+        Parameters
+        ----------
+        obs: 1-D array
+            The observations of all the sequences, concatenated, as indices
+            into the observation states.
+
+        lengths: 1-D array
+            The length of every sequence. If None, obs is a single sequence.
+
+        prior_probabilities, transition_matrix, emission_probabilities:
+            The initial parameters, see `MultinomialHMM`.
+
+        Returns
+        -------
+        self, with the trained prior_probabilities, transition_matrix and
+        emission_probabilities, and:
+
+        log_likelihoods: list
+            The total log-likelihood of the data before every update.
+
+        iteration_times: list
+            The time taken by every iteration in seconds.
+
+        converged: bool
+            Whether training stopped because of tol.
+        """
+        obs = np.asarray(obs)
+        lengths = np.asarray(lengths if lengths is not None else [len(obs)])
+        offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.prior_probabilities = np.array(prior_probabilities,
+                                            dtype=np.float64)
+        self.transition_matrix = np.array(transition_matrix,
+                                          dtype=np.float64)
+        self.emission_probabilities = np.array(emission_probabilities,
+                                               dtype=np.float64)
+        self.log_likelihoods = []
+        self.iteration_times = []
+        self.converged = False
+
+        chunks = _chunks(lengths, self.chunk_frames)
+        pool = None
+        if self.n_jobs != 1:
+            pool = Pool(self.n_jobs, initializer=_init_worker,
+                        initargs=(obs, lengths, offsets))
+        try:
+            for iteration in range(self.n_iter):
+                start_time = time.time()
+                tasks = [(first, last, self.prior_probabilities,
+                          self.transition_matrix,
+                          self.emission_probabilities)
+                         for first, last in chunks]
+                if pool is None:
+                    _init_worker(obs, lengths, offsets)
+                    results = map(_expected_counts_chunk, tasks)
+                else:
+                    results = pool.imap_unordered(_expected_counts_chunk,
+                                                  tasks)
+                log_prob = 0.
+                start_counts = 0.
+                transition_counts = 0.
+                emission_counts = 0.
+                for result in results:
+                    log_prob += result[0]
+                    start_counts = start_counts + result[1]
+                    transition_counts = transition_counts + result[2]
+                    emission_counts = emission_counts + result[3]
+
+                self.prior_probabilities = start_counts / start_counts.sum()
+                self.transition_matrix = normalize_rows(
+                    transition_counts, self.transition_matrix)
+                self.emission_probabilities = normalize_rows(
+                    emission_counts, self.emission_probabilities)
+
+                self.iteration_times.append(time.time() - start_time)
+                self.log_likelihoods.append(log_prob)
+                delta = (log_prob - self.log_likelihoods[-2]
+                         if iteration else np.nan)
+                if self.verbose:
+                    print("iteration {:>4}  log-likelihood {:.6f}  "
+                          "delta {:+.6f}  {:.2f}s".format(
+                              iteration + 1, log_prob, delta,
+                              self.iteration_times[-1]),
+                          file=sys.stderr)
+                if iteration and delta < self.tol:
+                    self.converged = True
+                    break
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            _init_worker(None, None, None)
+        return self
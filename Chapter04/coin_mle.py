@@ -14,6 +14,63 @@ def coin_mle(data):
     -------
     theta: The learned probability of getting a heads.
     """
-    data = np.array(data)
-    n_heads = np.sum(data)
-    return n_heads / data.size
+    return CoinMLE().update(data).finalize()
+
+
+class CoinMLE(object):
+    # The number of observations read at a time from large arrays.
+    chunk_size = 1000000
+
+    def __init__(self):
+        """
+        Streaming MLE of the probability of getting a heads.
+
+        Only the number of tosses and of heads are kept, so the data can
+        be read in one pass, chunk by chunk (lists, memory mapped arrays,
+        generators of chunks, ...). Estimators updated on different parts
+        of the data, e.g. by different worker processes, are combined
+        exactly with `merge`.
+        """
+        self.n_tosses = 0
+        self.n_heads = 0
+
+    def update(self, chunk):
+        """
+        Adds a chunk of observations, 1 for heads and 0 for tails.
+        """
+        chunk = np.asarray(chunk).ravel()
+        for start in range(0, len(chunk), self.chunk_size):
+            self.n_heads += int(np.count_nonzero(
+                chunk[start:start + self.chunk_size]))
+        self.n_tosses += len(chunk)
+        return self
+
+    def fit(self, chunks):
+        """
+        Adds every chunk of an iterable of chunks.
+        """
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of another estimator.
+
+        Parameters
+        ----------
+        other: CoinMLE
+            The estimator to merge into this one.
+        """
+        self.n_tosses += other.n_tosses
+        self.n_heads += other.n_heads
+        return self
+
+    def finalize(self):
+        """
+        Returns the learned probability of getting a heads, nan if no toss
+        was seen.
+        """
+        if not self.n_tosses:
+            return np.nan
+        return self.n_heads / self.n_tosses
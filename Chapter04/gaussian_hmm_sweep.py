@@ -0,0 +1,241 @@
+from __future__ import print_function
+
+import os
+import time
+from collections import namedtuple
+from multiprocessing import Array, Pool, shared_memory
+
+import numpy as np
+from hmmlearn.hmm import GaussianHMM
+
+FitResult = namedtuple('FitResult', ['n_components', 'seed', 'log_likelihood',
+                                     'bic', 'n_iter', 'converged', 'pruned',
+                                     'seconds', 'model'])
+
+SweepResult = namedtuple('SweepResult', ['best_model', 'best', 'fits',
+                                         'wall_time'])
+
+
+def n_parameters(n_components, n_features, covariance_type):
+    """
+    Returns the number of free parameters of a GaussianHMM.
+    """
+    n_covariance = {
+        'spherical': n_components,
+        'diag': n_components * n_features,
+        'full': n_components * n_features * (n_features + 1) // 2,
+        'tied': n_features * (n_features + 1) // 2,
+    }[covariance_type]
+    return ((n_components - 1) + n_components * (n_components - 1) +
+            n_components * n_features + n_covariance)
+
+
+def bic(log_likelihood, n_components, n_samples, n_features,
+        covariance_type):
+    """
+    Returns the Bayesian Information Criterion of a GaussianHMM, lower is
+    better.
+    """
+    return (-2 * log_likelihood + np.log(n_samples) *
+            n_parameters(n_components, n_features, covariance_type))
+
+
+# State of a worker process, set once by `_init_worker`.
+_worker_state = None
+
+
+def _init_worker(description, lengths, settings, best_log_likelihoods):
+    """
+    Attaches the shared feature matrix in a worker process.
+    """
+    global _worker_state
+    name, shape, dtype = description
+    block = shared_memory.SharedMemory(name=name)
+    X = np.ndarray(shape, dtype, buffer=block.buf)
+    X.flags.writeable = False
+    # The block is kept so that X stays valid.
+    _worker_state = block, X, lengths, settings, best_log_likelihoods
+
+
+def _fit_one(task):
+    """
+    Fits one GaussianHMM, check_every EM iterations at a time, and gives
+    up once it can't catch up with the best fit with as many components.
+    """
+    index, n_components, seed = task
+    _, X, lengths, settings, best_log_likelihoods = _worker_state
+    n_iter, tol, check_every, covariance_type, prune_margin = settings
+    start_time = time.time()
+
+    model = GaussianHMM(n_components=n_components,
+                        covariance_type=covariance_type, tol=tol,
+                        random_state=seed)
+    log_likelihood = None
+    n_done = 0
+    converged = pruned = False
+    while n_done < n_iter and not converged:
+        model.n_iter = min(check_every, n_iter - n_done)
+        if n_done:
+            # Go on from the current parameters.
+            model.init_params = ''
+        model.fit(X, lengths)
+        n_fitted = model.monitor_.iter
+        n_done += n_fitted
+        history = model.monitor_.history
+        previous, log_likelihood = log_likelihood, history[-1]
+        # Same test as the monitor, whose converged is also True when it
+        # runs out of iterations, and whose history starts over with every
+        # fit (a single entry when check_every is 1).
+        last = history[-2] if len(history) >= 2 else previous
+        converged = last is not None and log_likelihood - last < tol
+        if converged or previous is None:
+            continue
+        # EM improvements shrink, so going on at the rate of the last
+        # iterations is optimistic.
+        rate = (log_likelihood - previous) / n_fitted
+        projected = log_likelihood + rate * (n_iter - n_done)
+        if projected < best_log_likelihoods[index] - prune_margin:
+            pruned = True
+            break
+
+    if pruned:
+        return FitResult(n_components, seed, log_likelihood, np.nan, n_done,
+                         False, True, time.time() - start_time, None)
+    log_likelihood = model.score(X, lengths)
+    with best_log_likelihoods.get_lock():
+        best_log_likelihoods[index] = max(best_log_likelihoods[index],
+                                          log_likelihood)
+    return FitResult(n_components, seed, log_likelihood,
+                     bic(log_likelihood, n_components, X.shape[0],
+                         X.shape[1], covariance_type),
+                     n_done, converged, False, time.time() - start_time,
+                     model)
+
+
+def sweep_gaussian_hmm(X, lengths=None, n_components_range=range(2, 7),
+                       n_restarts=8, covariance_type='diag', n_iter=1000,
+                       tol=1e-2, check_every=10, prune_margin=0.,
+                       criterion='bic', n_jobs=None, random_state=0):
+    """
+    Fits GaussianHMMs with several numbers of components and random
+    restarts on a process pool, and returns the best one.
+
+    The feature matrix is copied once into shared memory, which every
+    worker attaches read only. Every fit runs `check_every` EM iterations
+    at a time: a restart is abandoned once its log-likelihood, projected
+    over the remaining iterations at its current rate of improvement,
+    falls below the best log-likelihood already reached with the same
+    number of components (minus `prune_margin`).
+
+    Parameters
+    ----------
+    X: 2-D array, shape (n_samples, n_features)
+        The feature matrix, as for GaussianHMM.fit.
+
+    lengths: 1-D array, optional
+        The lengths of the sequences in X, as for GaussianHMM.fit.
+
+    n_components_range: iterable of int
+        The numbers of components tried.
+
+    n_restarts: int
+        The number of random restarts for every number of components.
+
+    covariance_type, n_iter, tol:
+        See GaussianHMM.
+
+    check_every: int
+        The number of EM iterations between two pruning checks.
+
+    prune_margin: float
+        How far below the best log-likelihood a projection may end without
+        the restart being abandoned. Use np.inf to disable pruning.
+
+    criterion: 'bic' or 'log_likelihood'
+        How the best model is chosen. The log-likelihood only makes sense
+        for a single number of components.
+
+    n_jobs: int, optional
+        The number of worker processes, os.cpu_count() if None.
+
+    random_state: int
+        Seed of the seeds of the restarts.
+
+    Returns
+    -------
+    SweepResult:
+        best_model: the best fitted GaussianHMM.
+        best: the FitResult of the best model.
+        fits: the FitResult of every fit, by number of components and
+            restart. Pruned fits have no model and a nan BIC.
+        wall_time: the total time taken in seconds.
+    """
+    if criterion not in ('bic', 'log_likelihood'):
+        raise ValueError("criterion should be 'bic' or 'log_likelihood'.")
+    start_time = time.time()
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    n_components_range = list(n_components_range)
+    seeds = np.random.RandomState(random_state).randint(
+        2 ** 31 - 1, size=(n_restarts, len(n_components_range)))
+    # Restart by restart, so every number of components soon has a fit to
+    # prune the next ones against.
+    tasks = [(index, n_components, int(seeds[restart, index]))
+             for restart in range(n_restarts)
+             for index, n_components in enumerate(n_components_range)]
+    best_log_likelihoods = Array('d', [-np.inf] * len(n_components_range))
+    settings = (n_iter, tol, check_every, covariance_type, prune_margin)
+
+    block = shared_memory.SharedMemory(create=True, size=max(1, X.nbytes))
+    pool = None
+    try:
+        np.ndarray(X.shape, X.dtype, buffer=block.buf)[...] = X
+        initargs = ((block.name, X.shape, X.dtype.str), lengths, settings,
+                    best_log_likelihoods)
+        pool = Pool(n_jobs or os.cpu_count() or 1, initializer=_init_worker,
+                    initargs=initargs)
+        fits = pool.map(_fit_one, tasks, chunksize=1)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        block.close()
+        block.unlink()
+
+    fits.sort(key=lambda fit: (fit.n_components, fit.seed))
+    finished = [fit for fit in fits if not fit.pruned]
+    if criterion == 'bic':
+        best = min(finished, key=lambda fit: fit.bic)
+    else:
+        best = max(finished, key=lambda fit: fit.log_likelihood)
+    return SweepResult(best.model, best, fits, time.time() - start_time)
+
+
+def timing_report(result):
+    """
+    Returns a text report of a sweep: every fit with its log-likelihood,
+    BIC, iterations and time, and the totals.
+
+    Parameters
+    ----------
+    result: SweepResult
+        The result of `sweep_gaussian_hmm`.
+    """
+    lines = ["{:>12} {:>11} {:>16} {:>16} {:>6} {:>9} {:>9}".format(
+        'n_components', 'seed', 'log-likelihood', 'BIC', 'iter', 'status',
+        'seconds')]
+    for fit in result.fits:
+        status = ('pruned' if fit.pruned else
+                  'converged' if fit.converged else 'max iter')
+        best = ' *' if fit is result.best else ''
+        lines.append("{:>12} {:>11} {:>16.4f} {:>16.4f} {:>6} {:>9} "
+                     "{:>9.2f}{}".format(fit.n_components, fit.seed,
+                                         fit.log_likelihood, fit.bic,
+                                         fit.n_iter, status, fit.seconds,
+                                         best))
+    fit_time = sum(fit.seconds for fit in result.fits)
+    n_pruned = sum(fit.pruned for fit in result.fits)
+    lines.append("{} fits ({} pruned), {:.2f}s of fitting in {:.2f}s "
+                 "({:.1f}x)".format(len(result.fits), n_pruned, fit_time,
+                                    result.wall_time,
+                                    fit_time / result.wall_time))
+    return '\n'.join(lines)
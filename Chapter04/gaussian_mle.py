@@ -15,7 +15,148 @@ def gaussian_mle(data):
     \mu: The learned mean of the Normal Distribution.
     \sigma: The learned standard deviation of the Normal Distribution.
     """
-    data = np.array(data)
-    mu = np.mean(data)
-    variance = np.sqrt(np.mean((data - mu)**2))
-    return mu, variance
+    mu, variance = GaussianMLE().update(np.ravel(data)).finalize()
+    sigma = np.sqrt(variance)
+    return mu, sigma
+
+
+class GaussianMLE(object):
+    # The number of samples read at a time from large arrays.
+    chunk_size = 100000
+
+    def __init__(self):
+        """
+        Streaming (optionally weighted) MLE of the parameters of a Normal
+        Distribution, univariate or multivariate.
+
+        Only the total weight, the mean and the scatter matrix (the sum of
+        the weighted outer products of the deviations from the mean) are
+        kept. They are updated chunk by chunk with the pairwise formulas of
+        Chan et al., which are numerically stable, so the data can be read
+        in one pass (lists, memory mapped arrays, generators of chunks,
+        ...). Estimators updated on different parts of the data, e.g. by
+        different worker processes, are combined with the same formulas by
+        `merge`.
+
+        1-D chunks are univariate samples, 2-D chunks of shape
+        (n_samples, n_features) are multivariate samples.
+        """
+        self.weight = 0.
+        self.mean = None
+        self.scatter = None
+        self.univariate = None
+
+    def update(self, chunk, weights=None):
+        """
+        Adds a chunk of samples.
+
+        Parameters
+        ----------
+        chunk: 1-D or 2-D array-like
+            The samples, see `GaussianMLE`.
+
+        weights: 1-D array-like, optional
+            The weight of every sample, e.g. the posterior probability of a
+            state for the emissions of an HMM. 1 for every sample if None.
+        """
+        chunk = np.asarray(chunk)
+        univariate = chunk.ndim == 1
+        if self.univariate is None:
+            self.univariate = univariate
+        elif univariate != self.univariate:
+            raise ValueError("Can't mix univariate and multivariate "
+                             "samples.")
+        if univariate:
+            chunk = chunk[:, np.newaxis]
+        for start in range(0, len(chunk), self.chunk_size):
+            stop = start + self.chunk_size
+            self._add_block(
+                np.asarray(chunk[start:stop], dtype=np.float64),
+                None if weights is None else np.asarray(
+                    weights[start:stop], dtype=np.float64))
+        return self
+
+    def _add_block(self, samples, weights):
+        """
+        Adds the statistics of a block of samples, computed with two passes
+        over the block.
+        """
+        if weights is None:
+            weight = float(len(samples))
+            if not weight:
+                return
+            mean = samples.mean(axis=0)
+            deviations = samples - mean
+            scatter = deviations.T @ deviations
+        else:
+            weight = weights.sum()
+            if not weight:
+                return
+            mean = weights @ samples / weight
+            deviations = samples - mean
+            scatter = (deviations * weights[:, np.newaxis]).T @ deviations
+        self._combine(weight, mean, scatter)
+
+    def _combine(self, weight, mean, scatter):
+        """
+        Combines the statistics with the ones of another set of samples.
+        """
+        if self.mean is None:
+            self.weight = weight
+            self.mean = mean.copy()
+            self.scatter = scatter.copy()
+            return
+        if mean.shape != self.mean.shape:
+            raise ValueError("The number of features doesn't match.")
+        total = self.weight + weight
+        delta = mean - self.mean
+        self.mean += delta * (weight / total)
+        self.scatter += scatter + np.outer(delta, delta) * (
+            self.weight * weight / total)
+        self.weight = total
+
+    def fit(self, chunks):
+        """
+        Adds every chunk of an iterable of chunks.
+        """
+        for chunk in chunks:
+            self.update(chunk)
+        return self
+
+    def merge(self, other):
+        """
+        Adds the statistics of another estimator.
+
+        Parameters
+        ----------
+        other: GaussianMLE
+            The estimator to merge into this one.
+        """
+        if other.mean is None:
+            return self
+        if self.univariate is not None and (other.univariate !=
+                                            self.univariate):
+            raise ValueError("Can't mix univariate and multivariate "
+                             "samples.")
+        self.univariate = other.univariate
+        self._combine(other.weight, other.mean, other.scatter)
+        return self
+
+    def finalize(self):
+        """
+        Returns the learned parameters.
+
+        Returns
+        -------
+        mu: The learned mean, a float for univariate samples, an array of
+             shape (n_features,) otherwise.
+        covariance: The learned variance, a float for univariate samples,
+             the covariance matrix of shape (n_features, n_features)
+             otherwise.
+        """
+        if self.mean is None:
+            raise ValueError("No sample was seen.")
+        covariance = self.scatter / self.weight
+        if self.univariate:
+            return float(self.mean[0]), float(covariance[0, 0])
+        return self.mean.copy(), covariance
@@ -0,0 +1,314 @@
+import numpy as np
+
+from baum_welch import forward_backward, normalize_rows
+
+
+def _gaussian_log_likelihood(X, means, covars, covariance_type):
+    """
+    Returns log N(X[t] | means[i], covars[i]) for every frame t and state
+    i, as an array of shape (n_frames, n_states).
+    """
+    n_features = X.shape[1]
+    if covariance_type == 'diag':
+        return -0.5 * (n_features * np.log(2 * np.pi) +
+                       np.log(covars).sum(axis=1) +
+                       (X ** 2) @ (1 / covars).T -
+                       2 * X @ (means / covars).T +
+                       (means ** 2 / covars).sum(axis=1))
+    log_likelihood = np.empty((len(X), len(means)))
+    for state, (mean, covar) in enumerate(zip(means, covars)):
+        cholesky = np.linalg.cholesky(covar)
+        solved = np.linalg.solve(cholesky, (X - mean).T)
+        log_likelihood[:, state] = -0.5 * (
+            n_features * np.log(2 * np.pi) +
+            2 * np.log(np.diag(cholesky)).sum() + (solved ** 2).sum(axis=0))
+    return log_likelihood
+
+
+class OnlineGaussianHMM(object):
+    def __init__(self, startprob, transmat, means, covars,
+                 covariance_type='diag', decay=0.999, prior_weight=10.,
+                 min_covar=1e-3, refit_every=None, refit_window=None,
+                 refit_iter=10, refit_tol=1e-2):
+        """
+        HMM with Gaussian emissions, trained by online EM on a stream of
+        minibatches (e.g. one day of quotes at a time).
+
+        Only exponentially weighted sufficient statistics are kept: the
+        start and transition counts, and the occupancy and first and second
+        moments of the emissions of every state. Every minibatch runs one
+        E-step (see `baum_welch.forward_backward`) from the current
+        parameters, folds its expected statistics in after decaying the old
+        ones by decay ** len(batch), and updates the parameters, so a
+        minibatch costs time proportional to its size, however long the
+        stream.
+
+        A full refit (batch EM over the most recent frames) can be run
+        every `refit_every` frames, or explicitly with `refit`. Frames are
+        only kept for the refits if `refit_every` or `refit_window` is
+        given.
+
+        Parameters
+        ----------
+        startprob, transmat, means, covars:
+            The initial parameters, as the startprob_, transmat_, means_
+            and covars_ of an hmmlearn GaussianHMM. covars has the shape
+            (n_states, n_features) for 'diag', (n_states, n_features,
+            n_features) for 'full'.
+
+        covariance_type: 'diag' or 'full'
+            The type of covariance matrices.
+
+        decay: float
+            The weight of a frame is multiplied by decay for every newer
+            frame (frames of the same minibatch share the same weight), so
+            the model remembers about 1 / (1 - decay) frames.
+
+        prior_weight: float
+            The number of pseudo frames, distributed over the states, with
+            which the statistics are initialized from the initial
+            parameters. It keeps the first minibatches from overriding the
+            initial parameters completely.
+
+        min_covar: float
+            Floor added to the variances, so states with few frames don't
+            collapse.
+
+        refit_every: int, optional
+            If given, `refit` is called every refit_every frames.
+
+        refit_window: int, optional
+            The number of most recent frames kept for `refit`. If None and
+            refit_every is given, all the frames are kept, so the memory
+            and the time of a refit grow with the stream. If both are None,
+            no frame is kept and `refit` can't be used.
+
+        refit_iter, refit_tol:
+            The maximum number of EM iterations of a refit, and the
+            log-likelihood improvement under which it stops.
+        """
+        if covariance_type not in ('diag', 'full'):
+            raise ValueError("covariance_type should be 'diag' or 'full'.")
+        self.startprob_ = np.array(startprob, dtype=np.float64)
+        self.transmat_ = np.array(transmat, dtype=np.float64)
+        self.means_ = np.array(means, dtype=np.float64)
+        self.covars_ = np.array(covars, dtype=np.float64)
+        self.covariance_type = covariance_type
+        self.decay = decay
+        self.min_covar = min_covar
+        self.refit_every = refit_every
+        self.refit_window = refit_window
+        self.refit_iter = refit_iter
+        self.refit_tol = refit_tol
+
+        n_states = len(self.startprob_)
+        occupancy = np.full(n_states, prior_weight / n_states)
+        self._start_counts = self.startprob_.copy()
+        self._transition_counts = occupancy[:, np.newaxis] * self.transmat_
+        self._occupancy = occupancy
+        self._first_moments = occupancy[:, np.newaxis] * self.means_
+        if covariance_type == 'diag':
+            second = self.covars_ + self.means_ ** 2
+        else:
+            second = self.covars_ + np.einsum('ki,kj->kij', self.means_,
+                                              self.means_)
+        self._second_moments = (occupancy.reshape((n_states,) + (1,) *
+                                                  (second.ndim - 1)) *
+                                second)
+
+        # Filtered state distribution at the last frame seen.
+        self._last_posterior = None
+        # Recent sequences (lists of minibatches) kept for refits.
+        self._history = []
+        self._n_history_frames = 0
+        self._frames_since_refit = 0
+        self.n_frames = 0
+        self.last_log_likelihood = None
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
+        """
+        Returns an online model starting from the parameters of a fitted
+        hmmlearn GaussianHMM with 'diag' or 'full' covariances.
+        """
+        covars = np.asarray(model.covars_)
+        if model.covariance_type == 'diag' and covars.ndim == 3:
+            # Recent hmmlearn versions return full matrices.
+            covars = np.diagonal(covars, axis1=1, axis2=2)
+        return cls(model.startprob_, model.transmat_, model.means_, covars,
+                   covariance_type=model.covariance_type, **kwargs)
+
+    def _frame_likelihood(self, X):
+        """
+        Returns the emission likelihoods of the frames, each rescaled by a
+        factor which doesn't change the posteriors, and the sum of the
+        logs of these factors.
+        """
+        log_likelihood = _gaussian_log_likelihood(
+            X, self.means_, self.covars_, self.covariance_type)
+        shift = log_likelihood.max(axis=1, keepdims=True)
+        return np.exp(log_likelihood - shift), shift.sum()
+
+    def _emission_statistics(self, X, posteriors):
+        """
+        Returns the occupancy and the first and second moments of the
+        frames in every state.
+        """
+        occupancy = posteriors.sum(axis=0)
+        first_moments = posteriors.T @ X
+        if self.covariance_type == 'diag':
+            second_moments = posteriors.T @ X ** 2
+        else:
+            second_moments = np.einsum('tk,ti,tj->kij', posteriors, X, X)
+        return occupancy, first_moments, second_moments
+
+    def partial_fit(self, X, new_sequence=False):
+        """
+        Folds a minibatch into the statistics and updates the parameters.
+
+        Parameters
+        ----------
+        X: 2-D array, shape (n_frames, n_features)
+            The next frames of the stream.
+
+        new_sequence: bool
+            Whether X starts a new sequence. Otherwise it continues the
+            previous minibatch, whose last filtered state distribution is
+            used as the prior of the first frame.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if not len(X):
+            return self
+        continuing = not new_sequence and self._last_posterior is not None
+        if continuing:
+            predicted = self._last_posterior @ self.transmat_
+        else:
+            predicted = self.startprob_
+        frame_likelihood, log_shift = self._frame_likelihood(X)
+        log_prob, posteriors, start_counts, transition_counts = \
+            forward_backward(frame_likelihood, [len(X)], predicted,
+                              self.transmat_)
+        self.last_log_likelihood = log_prob[0] + log_shift
+
+        if continuing:
+            # Expected transition from the last frame of the previous
+            # minibatch to the first one of this one.
+            transition_counts += (self._last_posterior[:, np.newaxis] *
+                                  self.transmat_ *
+                                  (posteriors[0] / predicted))
+            start_counts = 0.
+        factor = self.decay ** len(X)
+        occupancy, first_moments, second_moments = \
+            self._emission_statistics(X, posteriors)
+        self._start_counts = factor * self._start_counts + start_counts
+        self._transition_counts = (factor * self._transition_counts +
+                                   transition_counts)
+        self._occupancy = factor * self._occupancy + occupancy
+        self._first_moments = factor * self._first_moments + first_moments
+        self._second_moments = (factor * self._second_moments +
+                                second_moments)
+        self._update_parameters()
+        self._last_posterior = posteriors[-1]
+
+        self.n_frames += len(X)
+        if self.refit_every is not None or self.refit_window is not None:
+            self._remember(X, new_sequence or not self._history)
+        self._frames_since_refit += len(X)
+        if (self.refit_every is not None and
+                self._frames_since_refit >= self.refit_every):
+            self.refit()
+        return self
+
+    def _update_parameters(self):
+        """
+        M-step: sets the parameters from the sufficient statistics.
+        """
+        # On a single long stream, the start counts fade out: the
+        # previous startprob_ is kept once they have all underflowed.
+        self.startprob_ = normalize_rows(self._start_counts, self.startprob_)
+        self.transmat_ = normalize_rows(self._transition_counts,
+                                         self.transmat_)
+        seen = self._occupancy > 0
+        occupancy = self._occupancy[seen, np.newaxis]
+        means = self._first_moments[seen] / occupancy
+        if self.covariance_type == 'diag':
+            covars = self._second_moments[seen] / occupancy - means ** 2
+            covars = np.maximum(covars, 0) + self.min_covar
+        else:
+            covars = (self._second_moments[seen] /
+                      occupancy[:, :, np.newaxis] -
+                      np.einsum('ki,kj->kij', means, means) +
+                      self.min_covar * np.eye(means.shape[1]))
+        self.means_[seen] = means
+        self.covars_[seen] = covars
+
+    def _remember(self, X, new_sequence):
+        """
+        Keeps a minibatch for the refits, dropping the oldest ones out of
+        the window.
+        """
+        if new_sequence:
+            self._history.append([])
+        self._history[-1].append(X)
+        self._n_history_frames += len(X)
+        while (self.refit_window is not None and
+               self._n_history_frames - len(self._history[0][0]) >=
+               self.refit_window):
+            self._n_history_frames -= len(self._history[0].pop(0))
+            if not self._history[0]:
+                self._history.pop(0)
+
+    def refit(self):
+        """
+        Runs batch EM from the current parameters on the frames kept (see
+        `refit_window`), then resets the statistics to the ones of the
+        refitted model, scaled to their current total weight.
+
+        Raises a ValueError if the model doesn't keep any frame, i.e. if
+        neither refit_every nor refit_window was given.
+        """
+        if self.refit_every is None and self.refit_window is None:
+            raise ValueError("No frames are kept for refits, give "
+                             "refit_every or refit_window.")
+        self._frames_since_refit = 0
+        if not self._history:
+            return self
+        X = np.concatenate([batch for sequence in self._history
+                            for batch in sequence])
+        lengths = [sum(len(batch) for batch in sequence)
+                   for sequence in self._history]
+        previous = None
+        for _ in range(self.refit_iter):
+            frame_likelihood, log_shift = self._frame_likelihood(X)
+            log_prob, posteriors, start_counts, transition_counts = \
+                forward_backward(frame_likelihood, lengths,
+                                  self.startprob_, self.transmat_)
+            # The statistics are rescaled to the weight the online ones
+            # had, so new minibatches keep the same influence.
+            scale = self._occupancy.sum() / len(X)
+            occupancy, first_moments, second_moments = \
+                self._emission_statistics(X, posteriors)
+            self._start_counts = start_counts
+            self._transition_counts = scale * transition_counts
+            self._occupancy = scale * occupancy
+            self._first_moments = scale * first_moments
+            self._second_moments = scale * second_moments
+            self._update_parameters()
+
+            log_prob = log_prob.sum() + log_shift
+            if previous is not None and log_prob - previous < self.refit_tol:
+                break
+            previous = log_prob
+        self._last_posterior = posteriors[-1]
+        return self
+
+    def score(self, X):
+        """
+        Returns the log-likelihood of a sequence under the current
+        parameters, without updating the model.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        frame_likelihood, log_shift = self._frame_likelihood(X)
+        log_prob = forward_backward(frame_likelihood, [len(X)],
+                                     self.startprob_, self.transmat_)[0]
+        return log_prob[0] + log_shift
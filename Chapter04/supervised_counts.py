@@ -0,0 +1,177 @@
+import numpy as np
+
+
+class SupervisedHMMEstimator(object):
+    def __init__(self, n_states, n_symbols):
+        """
+        Maximum likelihood estimator of a discrete HMM from labelled data,
+        i.e. sequences of (state, observation) pairs.
+
+        The data is consumed chunk by chunk (arrays, memory mapped arrays,
+        generators of chunks, ...) and only the start, transition and
+        emission counts are kept, so memory stays O(n_states^2 +
+        n_states x n_symbols) whatever the amount of data. Every chunk is
+        counted with a single bincount per table. Estimators fitted on
+        different parts of the data, e.g. by different worker processes,
+        can be combined with `merge`.
+
+        Parameters
+        ----------
+        n_states: int
+            The number of states. States are coded 0 to n_states - 1.
+
+        n_symbols: int
+            The number of observation symbols, coded 0 to n_symbols - 1.
+        """
+        self.n_states = n_states
+        self.n_symbols = n_symbols
+        self.start_counts = np.zeros(n_states, dtype=np.int64)
+        self.transition_counts = np.zeros((n_states, n_states),
+                                          dtype=np.int64)
+        self.emission_counts = np.zeros((n_states, n_symbols),
+                                        dtype=np.int64)
+        self._last_state = None
+
+    def partial_fit(self, chunk, new_sequence=False):
+        """
+        Adds the transitions and emissions of a chunk of a sequence to the
+        counts. The transition from the last state of the previous chunk to
+        the first state of this one is counted too, unless `new_sequence`
+        is True.
+
+        Parameters
+        ----------
+        chunk: 2-D array-like, shape (n, 2)
+            The next (state, observation) pairs of the sequence, as integer
+            codes.
+
+        new_sequence: bool
+            Whether the chunk starts a new sequence.
+        """
+        chunk = np.asarray(chunk)
+        if new_sequence:
+            self._last_state = None
+        if not len(chunk):
+            return self
+        states, observations = chunk[:, 0], chunk[:, 1]
+        if states.min() < 0 or states.max() >= self.n_states:
+            raise ValueError("State codes should be between 0 and "
+                             "{max}.".format(max=self.n_states - 1))
+        if observations.min() < 0 or observations.max() >= self.n_symbols:
+            raise ValueError("Observation codes should be between 0 and "
+                             "{max}.".format(max=self.n_symbols - 1))
+
+        states = states.astype(np.int64)
+        if self._last_state is None:
+            self.start_counts[states[0]] += 1
+            from_states, to_states = states[:-1], states[1:]
+        else:
+            from_states = np.concatenate([[self._last_state], states[:-1]])
+            to_states = states
+        self.transition_counts += np.bincount(
+            from_states * self.n_states + to_states,
+            minlength=self.n_states ** 2).reshape(self.transition_counts.shape)
+        self.emission_counts += np.bincount(
+            states * self.n_symbols + observations,
+            minlength=self.n_states * self.n_symbols).reshape(
+                self.emission_counts.shape)
+        self._last_state = int(states[-1])
+        return self
+
+    def end_sequence(self):
+        """
+        Marks the end of the current sequence, so the next chunk isn't
+        linked to it.
+        """
+        self._last_state = None
+        return self
+
+    def fit(self, sequences, chunk_size=1000000):
+        """
+        Adds the transitions and emissions of several sequences to the
+        counts.
+
+        Parameters
+        ----------
+        sequences: iterable of 2-D array-like, shape (n, 2)
+            The sequences of (state, observation) pairs. Each of them is
+            read in slices of `chunk_size` rows, so memory mapped arrays
+            are never loaded at once.
+
+        chunk_size: int
+            The number of rows processed at a time.
+        """
+        for sequence in sequences:
+            self.end_sequence()
+            for start in range(0, len(sequence), chunk_size):
+                self.partial_fit(sequence[start:start + chunk_size])
+        return self.end_sequence()
+
+    def merge(self, other):
+        """
+        Adds the counts of another estimator, e.g. one fitted by another
+        worker on a different part of the data.
+
+        Parameters
+        ----------
+        other: SupervisedHMMEstimator
+            The estimator to merge into this one.
+        """
+        if (other.n_states, other.n_symbols) != (self.n_states,
+                                                 self.n_symbols):
+            raise ValueError("Can't merge estimators with a different "
+                             "number of states or symbols.")
+        self.start_counts += other.start_counts
+        self.transition_counts += other.transition_counts
+        self.emission_counts += other.emission_counts
+        return self
+
+    def prior_probabilities(self, smoothing=0.):
+        """
+        Returns the estimated initial state probabilities, uniform if no
+        sequence was seen.
+
+        Parameters
+        ----------
+        smoothing: float
+            Pseudo count added to every state (additive smoothing).
+        """
+        counts = self.start_counts + smoothing
+        total = counts.sum()
+        if not total:
+            return np.full(self.n_states, 1 / self.n_states)
+        return counts / total
+
+    def transition_matrix(self, smoothing=0.):
+        """
+        Returns the estimated transition matrix, the row normalized counts.
+        States that were never left stay in place with probability 1.
+
+        Parameters
+        ----------
+        smoothing: float
+            Pseudo count added to every transition (additive smoothing).
+        """
+        counts = self.transition_counts + smoothing
+        totals = counts.sum(axis=1, keepdims=True)
+        unseen = totals[:, 0] == 0
+        counts[unseen, unseen] = 1
+        totals[unseen] = 1
+        return counts / totals
+
+    def emission_matrix(self, smoothing=0.):
+        """
+        Returns the estimated emission matrix, the row normalized counts.
+        States that were never seen emit uniformly.
+
+        Parameters
+        ----------
+        smoothing: float
+            Pseudo count added to every emission (additive smoothing).
+        """
+        counts = self.emission_counts + smoothing
+        totals = counts.sum(axis=1, keepdims=True)
+        unseen = totals[:, 0] == 0
+        counts[unseen] = 1
+        totals[unseen] = self.n_symbols
+        return counts / totals
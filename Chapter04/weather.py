@@ -1,7 +1,13 @@
+import numpy as np
+
+from supervised_counts import SupervisedHMMEstimator
+
+
 def weather_fit(data):
     """
     Learn the transition and emission probabilities from the given data
-    for the weather model.
+    for the weather model, see `SupervisedHMMEstimator` for any number of
+    states and symbols.
 
     Parameters
     ----------
@@ -23,14 +29,6 @@ def weather_fit(data):
         The conditional distribution respresenting the emission probability
         of the model.
     """
-    data = np.array(data)
-    transition_counts = np.zeros((3, 3))
-    emission_counts = np.zeros((3, 2))
-    for index, datapoint in enumerate(data):
-        if index != len(data)-1:
-            transition_counts[data[index][0], data[index+1][0]] += 1
-        emission_counts[data[index][0], data[index][1]] += 1
-    transition_prob = transition_counts / np.sum(transition_counts, axis=0)
-    emission_prob = (emission_counts.T / np.sum(emission_counts.T,
-                                                axis=0)).T
-    return transition_prob, emission_prob
+    estimator = SupervisedHMMEstimator(n_states=3, n_symbols=2)
+    estimator.partial_fit(np.asarray(data))
+    return estimator.transition_matrix(), estimator.emission_matrix()